@@ -33,7 +33,8 @@ def downloadArtifacts(remoteRepoUrl, localRepoDir, artifact, checksumMode, mkdir
         # Download main artifact
         artifactUrl = remoteRepoUrl + artifact.getArtifactFilepath()
         artifactLocalPath = os.path.join(localRepoDir, artifact.getArtifactFilepath())
-        maven_repo_util.fetchFile(artifactUrl, artifactLocalPath, checksumMode, True, True, filesetLock, fileset)
+        maven_repo_util.fetchFile(artifactUrl, artifactLocalPath, checksumMode, True, True, filesetLock, fileset,
+                                  artifact.fileInfo)
     except BaseException as ex:
         logging.error("Error while downloading artifact %s: %s", artifact, str(ex))
         errors.put(ex)
@@ -62,6 +63,13 @@ def depListToArtifactList(depList):
     return artifactList
 
 
+def _getKnownSize(artifact):
+    """Returns size of the artifact file if the artifact source provided it, 0 otherwise."""
+    if artifact.fileInfo and artifact.fileInfo.get("size"):
+        return artifact.fileInfo["size"]
+    return 0
+
+
 def fetchArtifactList(remoteRepoUrl, localRepoDir, artifactList, checksumMode):
     """Create a Maven repository based on a remote repository url and a list of artifacts"""
     logging.info('Retrieving artifacts from repository: %s', remoteRepoUrl)
@@ -79,8 +87,10 @@ def fetchArtifactList(remoteRepoUrl, localRepoDir, artifactList, checksumMode):
         filesetLock = Lock()
         fileset = set([])
 
-        for artifact in artifactList:
-            if artifact.isSnapshot():
+        # the largest files known from the artifact source are downloaded first not to be left at the end
+        for artifact in sorted(artifactList, key=_getKnownSize, reverse=True):
+            # file info is known only for files listed under their -SNAPSHOT name, they need no version suffix
+            if artifact.isSnapshot() and not artifact.fileInfo:
                 maven_repo_util.updateSnapshotVersionSuffix(artifact, remoteRepoUrl)
             pool.apply_async(
                 downloadArtifacts,
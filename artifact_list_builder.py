@@ -1,4 +1,7 @@
+import bisect
 import copy
+import hashlib
+import json
 import os
 import re
 import logging
@@ -6,14 +9,20 @@ import traceback
 from indy_apis import IndyApi
 import multiprocessing.pool
 from multiprocessing.pool import ThreadPool
-from multiprocessing import Lock
-from multiprocessing import Queue
+from Queue import Queue
 from subprocess import Popen
 from subprocess import PIPE
+from threading import Condition
+from threading import Lock
 
 import maven_repo_util
+from filter import Filter
 from maven_artifact import MavenArtifact
-import time
+from pattern_matcher import PathPruner
+from pom_resolver import PomResolver
+from repository_crawler import HttpDirectoryCrawler
+from repository_crawler import ListingCache
+from repository_crawler import LocalDirectoryWalker
 
 
 class ArtifactListBuilder:
@@ -29,7 +38,7 @@ class ArtifactListBuilder:
 
     SETTINGS_TPL = """
         <settings>
-          <localRepository>${temp}.m2/repository</localRepository>
+          <localRepository>${localRepository}</localRepository>
           <mirrors>
             <mirror>
               <id>maven-repo-builder-override</id>
@@ -39,19 +48,68 @@ class ArtifactListBuilder:
           </mirrors>
         </settings>"""
 
+    # default persistent Maven local repository used by dependency-list sources
+    MAVEN_LOCAL_REPOSITORY = "cache/m2-repository"
+
     notMainExtClassifiers = set(["pom:", "jar:javadoc", "jar:sources", "jar:tests", "jar:test-sources",
                                  "tar.gz:project-sources", "xml:site", "zip:patches",
                                  "zip:scm-sources"])
 
     IGNORED_REPOSITORY_FILES = set(["maven-metadata.xml", "maven-metadata.xml.md5", "maven-metadata.xml.sha1"])
 
+    # checksum types whose files are downloaded along with artifacts
+    CHECKSUM_TYPES = ("md5", "sha1")
+
+    # extensions of files accompanying artifacts in repositories
+    SIDECAR_EXTENSIONS = (".md5", ".sha1", ".sha256", ".sha512", ".asc")
+
+    # the first Maven version synchronizing concurrent processes sharing a local repository
+    MIN_CONCURRENT_MAVEN_VERSION = (3, 9)
+
+    # maximum total length of versions passed to one run of the Atlas version sorter, so that its command line stays
+    # well below ARG_MAX
+    MAX_VERSION_SORT_LENGTH = 65536
+
     MAX_THREADS_DICT = {"mead-tag": 2, "dependency-list": 1, "dependency-graph": 6, "repository": 2}
 
+    # directory with cached archive lists of mead-tag sources
+    MEAD_TAG_CACHE_DIR = "cache/mead-tags"
+
+    # number of koji calls sent in one multicall request
+    KOJI_MULTICALL_BATCH = 100
+
+    # archive fields kept in the mead-tag cache
+    KOJI_ARCHIVE_FIELDS = ("build_id", "build_name", "build_version", "build_release", "group_id", "artifact_id",
+                           "version", "filename", "checksum", "checksum_type", "size")
+
+    # checksum types of koji archives, see koji.CHECKSUM_TYPES
+    KOJI_CHECKSUM_TYPES = {0: "md5", 1: "sha1", 2: "sha256"}
+
+    # number of prefixes listed concurrently by a single repository source, every remote listing is crawled by
+    # another HttpDirectoryCrawler.maxThreads threads
+    MAX_LISTING_THREADS = 4
+
+    CHECKSUM_EXTENSIONS = (".md5", ".sha1", ".sha256", ".asc")
+
+    MAX_CACHED_FILENAME_REGEXPS = 10000
+
+    # number of locks guarding GAs of the artifact list while results of sources are merged into it
+    MERGE_LOCK_COUNT = 64
+
+    _plainVersionRegEx = re.compile(r'[\w.\-]*$')
+
+    _filenameRegExpsCache = {}
+
     def __init__(self, configuration):
         self.configuration = configuration
         self.errors = Queue()
-        self.results_lock = Lock()
-        self.results = {}
+        # notified whenever a source finishes or fails
+        self.results_condition = Condition()
+        # priorities of finished sources
+        self.finished = set()
+        # results of sources are merged into the artifact list as soon as they finish
+        self.artifactList = {}
+        self.merge_locks = [Lock() for _ in xrange(self.MERGE_LOCK_COUNT)]
         self.max_threads = 6
 
     def buildList(self):
@@ -72,28 +130,22 @@ class ArtifactListBuilder:
         for pool in pool_dict.values():
             pool.close()
 
-        at_least_1_runs = True
-        all_keys = range(1, len(self.configuration.artifactSources) + 1)
-        finished = False
-        while at_least_1_runs:
-            for i in range(30):
-                time.sleep(1)
-
-                if not self.errors.empty():
-                    for pool in pool_dict.values():
-                        logging.debug("Terminating pool %s", str(pool))
-                        pool.terminate()
-                    finished = True
-                    break
+        sourceCount = len(self.configuration.artifactSources)
+        self.results_condition.acquire()
+        try:
+            while self.errors.empty() and len(self.finished) < sourceCount:
+                # the timeout keeps the wait interruptible and is used only to log progress
+                self.results_condition.wait(30)
+                if self.errors.empty() and len(self.finished) < sourceCount:
+                    waiting = set(range(1, sourceCount + 1)) - self.finished
+                    logging.debug("Still waiting for priorities %s to finish", str(sorted(waiting)))
+        finally:
+            self.results_condition.release()
 
-            at_least_1_runs = False
-            if not finished:            
-                self.results_lock.acquire()
-                finished = sorted(list(self.results.keys()))
-                self.results_lock.release()
-                if all_keys != finished:
-                    logging.debug("Still waiting for priorities %s to finish", str(list(set(all_keys) - set(finished))))
-                    at_least_1_runs = True
+        if not self.errors.empty():
+            for pool in pool_dict.values():
+                logging.debug("Terminating pool %s", str(pool))
+                pool.terminate()
 
         for pool in pool_dict.values():
             if pool._state != multiprocessing.pool.TERMINATE:
@@ -102,31 +154,48 @@ class ArtifactListBuilder:
         if not self.errors.empty():
             raise RuntimeError("%i error(s) occured during reading of artifact list." % self.errors.qsize())
 
-        return self._get_artifact_list()
+        return self.artifactList
 
     def _add_result(self, result):
-        if result:
-            try:
-                self.results_lock.acquire()
-                self.results.update(result)
-            finally:
-                self.results_lock.release()
-
-    def _get_artifact_list(self):
-        artifactList = {}
-        for priority, artifacts in self.results.iteritems():
-            logging.debug("Placing %d artifacts in the result list", len(artifacts))
-            for artifact in artifacts:
-                ga = artifact.getGA()
-                artSpec = artifacts[artifact]
-                artifactList.setdefault(ga, {}).setdefault(priority, {})
-                if artifact.version in artifactList[ga][priority]:
-                    artifactList[ga][priority][artifact.version].merge(artSpec)
-                else:
-                    artifactList[ga][priority][artifact.version] = artSpec
-            logging.debug("The result contains %d GAs so far", len(artifactList))
+        # runs in the result handler thread of the pool, an exception would stop it and buildList would never wake up
+        try:
+            if result:
+                for priority, artifacts in result.iteritems():
+                    self._merge_artifacts(priority, artifacts)
+        except BaseException as ex:
+            tb = traceback.format_exc()
+            logging.error("Error while placing artifacts of priorities %s in the result list: %s. Traceback\n%s",
+                          str(sorted(result.keys())), ex, tb)
+            self.errors.put(ex)
+        self.results_condition.acquire()
+        try:
+            if result:
+                self.finished.update(result.keys())
+            self.results_condition.notify_all()
+        finally:
+            self.results_condition.release()
 
-        return artifactList
+    def _merge_artifacts(self, priority, artifacts):
+        """
+        Places artifacts of a finished source into the artifact list. Results of several sources can be merged at
+        the same time, every GA is guarded by one of the merge locks. The merged artifacts are removed from the
+        source result, so that it does not stay in memory along with the artifact list.
+
+        :param priority: priority of the source
+        :param artifacts: dictionary MavenArtifact -> ArtifactSpec read from the source
+        """
+        logging.debug("Placing %d artifacts of priority %i in the result list", len(artifacts), priority)
+        while artifacts:
+            (artifact, artSpec) = artifacts.popitem()
+            ga = artifact.getGA()
+            with self.merge_locks[hash(ga) % self.MERGE_LOCK_COUNT]:
+                # setdefault inserts the GA atomically, so that GAs guarded by other locks are not lost
+                versions = self.artifactList.setdefault(ga, {}).setdefault(priority, {})
+                if artifact.version in versions:
+                    versions[artifact.version].merge(artSpec)
+                else:
+                    versions[artifact.version] = artSpec
+        logging.debug("The result contains %d GAs so far", len(self.artifactList))
 
     def _read_artifact_source(self, source, priority):
         """
@@ -149,7 +218,9 @@ class ArtifactListBuilder:
                                                    self._parseDepList(source['top-level-gavs']),
                                                    source['recursive'],
                                                    source['include-scope'],
-                                                   source['skip-missing'])
+                                                   source['skip-missing'],
+                                                   source['maven-processes'],
+                                                   source['resolver'])
             elif source['type'] == 'dependency-graph':
                 logging.info("Building artifact list from dependency graph of top level GAVs")
                 artifacts = self._listDependencyGraph(source['indy-url'],
@@ -167,10 +238,12 @@ class ArtifactListBuilder:
                 logging.info("Building artifact list from repository %s", source['repo-url'])
                 artifacts = self._listRepository(source['repo-url'],
                                                  source['included-gav-patterns'],
-                                                 source['included-gatcvs'])
+                                                 source['included-gatcvs'],
+                                                 self.configuration.excludedGAVs + source["excludedGAVs"],
+                                                 self.configuration.singleVersion and source['prune-versions'])
             else:
                 logging.warning("Unsupported source type: %s", source['type'])
-                return
+                return {priority: {}}
 
             if source["excludedGAVs"]:
                 self._filterExcludedGAVs(artifacts, source["excludedGAVs"], priority)
@@ -180,6 +253,7 @@ class ArtifactListBuilder:
             tb = traceback.format_exc()
             logging.error("Error while reading artifacts in priority %i: %s. Traceback\n%s", priority, ex, tb)
             self.errors.put(ex)
+            self._add_result(None)
             raise ex
 
     def _filterExcludedGAVs(self, artifacts, excludedGAVs, priority):
@@ -192,18 +266,11 @@ class ArtifactListBuilder:
         :returns: artifact list without artifacts that matched specified GAVs.
         """
         logging.debug("Filtering excluded GAVs from partial result (priority %i).", priority)
-        regExps = maven_repo_util.getRegExpsFromStrings(excludedGAVs)
-        gavRegExps = []
-        gatcvRegExps = []
-        for regExp in regExps:
-            if regExp.pattern.count(":") > 2:
-                gatcvRegExps.append(regExp)
-            else:
-                gavRegExps.append(regExp)
+        (gavMatcher, gatcvMatcher) = maven_repo_util.getGAVAndGATCVMatchers(excludedGAVs)
         for artifact in copy.copy(artifacts):
             gav = artifact.getGAV()
             artSpec = artifacts[artifact]
-            if maven_repo_util.somethingMatch(gavRegExps, gav):
+            if gavMatcher.match(gav):
                 del artifacts[artifact]
             else:
                 for artType in copy.deepcopy(artSpec.artTypes.keys()):
@@ -214,7 +281,7 @@ class ArtifactListBuilder:
                             gatcv = "%s:%s:%s:%s" % (ga, artType, classifier, artifact.version)
                         else:
                             gatcv = "%s:%s:%s" % (ga, artType, artifact.version)
-                        if maven_repo_util.somethingMatch(gatcvRegExps, gatcv):
+                        if gatcvMatcher.match(gatcv):
                             logging.debug("Dropping GATCV %s because it matches an excluded GAV pattern.", gatcv)
                             at.classifiers.remove(classifier)
                     if not at.classifiers:
@@ -239,10 +306,10 @@ class ArtifactListBuilder:
         import koji
 
         kojiSession = koji.ClientSession(kojiUrl)
-        logging.debug("Getting latest maven artifacts from tag %s.", tagName)
-        kojiArtifacts = kojiSession.getLatestMavenArchives(tagName)
+        kojiArtifacts = self._getMeadTagArchives(koji, kojiSession, kojiUrl, tagName)
 
         filenameDict = {}
+        filesDict = {}  # { (g,a,v,url): {filename: {"size": size, checksumType: checksum}} }
         for artifact in kojiArtifacts:
             groupId = artifact['group_id']
             artifactId = artifact['artifact_id']
@@ -252,6 +319,10 @@ class ArtifactListBuilder:
             gavu = (groupId, artifactId, version, gavUrl)
             filename = artifact['filename']
             filenameDict.setdefault(gavu, []).append(filename)
+            fileInfo = {"size": artifact.get('size')}
+            if artifact.get('checksum') and artifact.get('checksum_type') in self.KOJI_CHECKSUM_TYPES:
+                fileInfo[self.KOJI_CHECKSUM_TYPES[artifact['checksum_type']]] = artifact['checksum']
+            filesDict.setdefault(gavu, {})[filename] = fileInfo
 
         gavuExtClass = {}  # { (g,a,v,url): {ext: set([class])} }
         suffixes = {}      # { (g,a,v,url): suffix }
@@ -271,13 +342,102 @@ class ArtifactListBuilder:
 
         artifacts = {}
         for gavu in gavuExtClass:
-            self._addArtifact(artifacts, gavu[0], gavu[1], gavu[2], gavuExtClass[gavu], suffixes.get(gavu), gavu[3])
+            self._addArtifact(artifacts, gavu[0], gavu[1], gavu[2], gavuExtClass[gavu], suffixes.get(gavu), gavu[3],
+                              filesDict[gavu])
 
         if gavPatterns:
             logging.debug("Filtering artifacts contained in the tag by GAV patterns list.")
         return self._filterArtifactsByPatterns(artifacts, gavPatterns, None)
 
-    def _listDependencies(self, repoUrls, gavs, recursive, include_scope, skipmissing):
+    def _getMeadTagArchives(self, koji, kojiSession, kojiUrl, tagName):
+        """
+        Loads the latest maven archives of a koji tag. When the cache is enabled, the archives are cached on disk
+        together with the last event which changed the tag. An unchanged tag is answered from the cache, a changed
+        one is refreshed by listing archives only of builds which were not tagged before, by multicall batches.
+
+        :param koji: the koji module
+        :param kojiSession: koji client session
+        :param kojiUrl: Koji/Brew/Mead URL
+        :param tagName: Koji/Brew/Mead tag name
+        :returns: list of archive dictionaries with koji archive fields listed in KOJI_ARCHIVE_FIELDS
+        """
+        if not self.configuration.useCache:
+            logging.debug("Getting latest maven artifacts from tag %s.", tagName)
+            return kojiSession.getLatestMavenArchives(tagName)
+
+        try:
+            event = kojiSession.tagLastChangeEvent(tagName, True)
+        except koji.GenericError as ex:
+            logging.debug("Unable to get the last change event of tag %s, the cache is not used: %s", tagName, ex)
+            return kojiSession.getLatestMavenArchives(tagName)
+
+        cacheKey = hashlib.sha1(kojiUrl + "|" + tagName).hexdigest()
+        cachePath = os.path.join(self.MEAD_TAG_CACHE_DIR, cacheKey + ".json")
+        cached = None
+        if os.path.exists(cachePath):
+            with open(cachePath) as cacheFile:
+                cached = json.load(cacheFile)
+            cached["archives"] = [dict((key, value.encode("utf-8") if isinstance(value, unicode) else value)
+                                       for (key, value) in archive.iteritems()) for archive in cached["archives"]]
+            if cached.get("fields") != list(self.KOJI_ARCHIVE_FIELDS):
+                cached = None
+            elif cached["event"] == event:
+                logging.debug("Tag %s has not changed since event %s, using cached archives.", tagName, event)
+                return cached["archives"]
+
+        if cached is None:
+            logging.debug("Getting latest maven artifacts from tag %s.", tagName)
+            archives = kojiSession.getLatestMavenArchives(tagName)
+        else:
+            logging.debug("Tag %s changed since event %s, refreshing cached archives.", tagName, cached["event"])
+            archives = self._refreshMeadTagArchives(kojiSession, tagName, cached["archives"])
+        archives = [dict((field, archive[field]) for field in self.KOJI_ARCHIVE_FIELDS) for archive in archives]
+
+        if not os.path.exists(self.MEAD_TAG_CACHE_DIR):
+            os.makedirs(self.MEAD_TAG_CACHE_DIR)
+        with open(cachePath + ".tmp", "w") as cacheFile:
+            json.dump({"event": event, "tag": tagName, "fields": self.KOJI_ARCHIVE_FIELDS, "archives": archives},
+                      cacheFile)
+        os.rename(cachePath + ".tmp", cachePath)
+        return archives
+
+    def _refreshMeadTagArchives(self, kojiSession, tagName, cachedArchives):
+        """
+        Updates cached archives of a tag to its current content. Archives of builds which are still the latest in the
+        tag are reused, archives of newly tagged builds are listed by multicall batches.
+
+        :param kojiSession: koji client session
+        :param tagName: Koji/Brew/Mead tag name
+        :param cachedArchives: list of previously loaded archives of the tag
+        :returns: list of current archive dictionaries
+        """
+        buildArchives = {}
+        for archive in cachedArchives:
+            buildArchives.setdefault(archive["build_id"], []).append(archive)
+
+        archives = []
+        newBuilds = []
+        for build in kojiSession.getLatestBuilds(tagName, type="maven"):
+            if build["build_id"] in buildArchives:
+                archives.extend(buildArchives[build["build_id"]])
+            else:
+                newBuilds.append(build)
+        logging.debug("Listing archives of %d new builds in tag %s.", len(newBuilds), tagName)
+
+        for start in range(0, len(newBuilds), self.KOJI_MULTICALL_BATCH):
+            batch = newBuilds[start:start + self.KOJI_MULTICALL_BATCH]
+            kojiSession.multicall = True
+            for build in batch:
+                kojiSession.listArchives(buildID=build["build_id"], type="maven")
+            for (build, result) in zip(batch, kojiSession.multiCall(strict=True)):
+                for archive in result[0]:
+                    archive = dict(archive, build_id=build["build_id"], build_name=build["name"],
+                                   build_version=build["version"], build_release=build["release"])
+                    archives.append(archive)
+        return archives
+
+    def _listDependencies(self, repoUrls, gavs, recursive, include_scope, skipmissing, mavenProcesses=1,
+                          resolver="maven"):
         """
         Loads maven artifacts from mvn dependency:list.
 
@@ -286,112 +446,227 @@ class ArtifactListBuilder:
         :param recursive: runs dependency:list recursively using the previously discovered dependencies if True
         :param include_scope: defines scope which will be used when running mvn as includeScope parameter, can be None
                               to use Maven's default
+        :param mavenProcesses: maximum number of Maven processes running concurrently, GAVs are resolved in waves,
+                               each wave contains dependencies discovered in the previous one
+        :param resolver: "maven" to run mvn dependency:list or "python" to resolve the dependencies by PomResolver
+                         without Maven
         :returns: Dictionary where index is MavenArtifact object and value is
                   ArtifactSpec with its repo root URL
         """
         artifacts = {}
         workingSet = set(gavs)
         checkedSet = set()
+        pomResolver = PomResolver(repoUrls) if resolver == "python" else None
+
+        # the directories are created in advance to avoid races of concurrent Maven runs creating them
+        for directory in ("poms", maven_repo_util.getTempDir()):
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+
+        if mavenProcesses > 1 and not pomResolver:
+            mavenVersion = self._getMavenVersion()
+            if mavenVersion is None or mavenVersion < self.MIN_CONCURRENT_MAVEN_VERSION:
+                logging.warning("Maven %s does not synchronize concurrent processes sharing a local repository, "
+                                "running 1 Maven process instead of %d",
+                                ".".join(map(str, mavenVersion)) if mavenVersion else "of unknown version",
+                                mavenProcesses)
+                mavenProcesses = 1
+
+        pool = ThreadPool(mavenProcesses) if mavenProcesses > 1 else None
+        try:
+            while workingSet:
+                wave = sorted(workingSet)
+                checkedSet.update(wave)
+                workingSet = set()
+                if pool:
+                    results = [pool.apply_async(self._listDependenciesOfGav, [gav, repoUrls, include_scope,
+                                                                              skipmissing, pomResolver])
+                               for gav in wave]
+                    waveArtifacts = [result.get() for result in results]
+                else:
+                    waveArtifacts = [self._listDependenciesOfGav(gav, repoUrls, include_scope, skipmissing,
+                                                                 pomResolver)
+                                     for gav in wave]
 
-        while workingSet:
-            gav = workingSet.pop()
-            checkedSet.add(gav)
-            logging.debug("Resolving dependencies for %s", gav)
-            artifact = MavenArtifact.createFromGAV(gav)
-
-            pomFilename = 'poms/' + artifact.getPomFilename()
-            successPomUrl = None
-            fetched = False
-            for repoUrl in repoUrls:
-                pomUrl = maven_repo_util.slashAtTheEnd(repoUrl) + artifact.getPomFilepath()
-                fetched = maven_repo_util.fetchFile(pomUrl, pomFilename)
-                if fetched:
-                    successPomUrl = repoUrl
-                    break
+                # merged in the order of GAVs so that the result does not depend on the order of finishing
+                for (newArtifacts, dependencyGavs) in waveArtifacts:
+                    if newArtifacts is None:
+                        continue
+                    if recursive:
+                        # dependencies skipped by the listing of their files are still followed
+                        for ngav in dependencyGavs:
+                            if ngav not in checkedSet:
+                                workingSet.add(ngav)
+                    artifacts.update(newArtifacts)
+        finally:
+            if pool:
+                pool.terminate()
+                pool.join()
 
-            if not fetched:
-                logging.warning("Failed to retrieve pom file for artifact %s", gav)
-                continue
+        return artifacts
 
-            tempDir = maven_repo_util.getTempDir()
-            if not os.path.exists(tempDir):
-                os.makedirs(tempDir)
-
-            # Create settings.xml
-            settingsFile = tempDir + "settings.xml"
-            settingsContent = self.SETTINGS_TPL.replace('${url}', successPomUrl) \
-                                               .replace('${temp}', maven_repo_util.getTempDir())
-            with open(settingsFile, 'w') as settings:
-                settings.write(settingsContent)
-
-            # Build dependency:list
-            depsDir = tempDir + "maven-deps-output/"
-            outFile = depsDir + gav + ".out"
-            args = ['mvn', 'dependency:list', '-N',
-                                              '-DoutputFile=' + outFile,
-                                              '-f', pomFilename,
-                                              '-s', settingsFile]
-            if include_scope:
-                args.append("-DincludeScope=%s" % include_scope)
-            logging.debug("Running Maven:\n  %s", " ".join(args))
-            logging.debug("settings.xml contents: %s", settingsContent)
-            mvn = Popen(args, stdout=PIPE)
-            mvnStdout = mvn.communicate()[0]
-            logging.debug("Maven output:\n%s", mvnStdout)
-
-            if mvn.returncode != 0:
-                logging.warning("Maven failed to finish with success. Skipping artifact %s", gav)
-                continue
+    def _listDependenciesOfGav(self, gav, repoUrls, include_scope, skipmissing, pomResolver=None):
+        """
+        Resolves dependencies of the given GAV by mvn dependency:list or by the given PomResolver and finds them in
+        the repositories.
 
-            with open(outFile, 'r') as out:
-                depLines = out.readlines()
+        :returns: tuple of a dictionary where index is MavenArtifact object and value is ArtifactSpec with its repo
+                  root URL and a list of GAVs of all dependencies found in the repositories, including those skipped
+                  during listing of their files; the dictionary is None if the dependencies could not be resolved
+        """
+        if pomResolver is None:
+            gavList = self._runDependencyList(gav, repoUrls, include_scope)
+        else:
+            logging.debug("Resolving dependencies for %s", gav)
+            depLines = pomResolver.resolve(gav, include_scope)
+            if depLines is None:
+                return (None, [])
             gavList = self._parseDepList(depLines)
             logging.debug("Resolved dependencies of %s: %s", gav, str(gavList))
+        if gavList is None:
+            return (None, [])
 
-            newArtifacts = self._listArtifacts(repoUrls, gavList)
-
-            if recursive:
-                for artifact in newArtifacts:
-                    ngav = artifact.getGAV()
-                    if ngav not in checkedSet:
-                        workingSet.add(ngav)
-
-            if self.configuration.isAllClassifiers():
-                resultingArtifacts = {}
-                for artifact in newArtifacts.keys():
-                    spec = newArtifacts[artifact]
-                    try:
-                        out = self._lftpFind(spec.url + artifact.getDirPath())
-                    except IOError as ex:
-                        if skipmissing:
-                            logging.warn("Error while listing files in %s: %s. Skipping...",
-                                         spec.url + artifact.getDirPath(), str(ex))
-                            continue
-                        else:
-                            raise ex
+        newArtifacts = self._listArtifacts(repoUrls, gavList)
+        dependencyGavs = [artifact.getGAV() for artifact in newArtifacts]
 
-                    files = []
-                    for line in out.split('\n'):
+        if self.configuration.isAllClassifiers():
+            resultingArtifacts = {}
+            for artifact in newArtifacts.keys():
+                spec = newArtifacts[artifact]
+                files = []
+                try:
+                    for line in self._findFiles(spec.url + artifact.getDirPath(), maxDepth=1):
                         if line != "./" and line != "":
                             files.append(line[2:])
+                except IOError as ex:
+                    if skipmissing:
+                        logging.warn("Error while listing files in %s: %s. Skipping...",
+                                     spec.url + artifact.getDirPath(), str(ex))
+                        continue
+                    else:
+                        raise ex
 
-                    (extsAndClass, suffix) = self._getExtensionsAndClassifiers(
-                        artifact.artifactId, artifact.version, files)
-                    if artifact.artifactType in extsAndClass:
-                        self._addArtifact(resultingArtifacts, artifact.groupId, artifact.artifactId,
-                                          artifact.version, extsAndClass, suffix, spec.url)
+                (extsAndClass, suffix) = self._getExtensionsAndClassifiers(
+                    artifact.artifactId, artifact.version, files)
+                if artifact.artifactType in extsAndClass:
+                    self._addArtifact(resultingArtifacts, artifact.groupId, artifact.artifactId,
+                                      artifact.version, extsAndClass, suffix, spec.url)
+                else:
+                    if files:
+                        logging.warn("Main artifact (%s) is missing in filelist listed from %s. Files were:\n%s",
+                                     artifact.artifactType, spec.url + artifact.getDirPath(), "\n".join(files))
                     else:
-                        if files:
-                            logging.warn("Main artifact (%s) is missing in filelist listed from %s. Files were:\n%s",
-                                         artifact.artifactType, spec.url + artifact.getDirPath(), "\n".join(files))
-                        else:
-                            logging.warn("An empty filelist was listed from %s. Skipping...",
-                                         spec.url + artifact.getDirPath())
-                newArtifacts = resultingArtifacts
+                        logging.warn("An empty filelist was listed from %s. Skipping...",
+                                     spec.url + artifact.getDirPath())
+            newArtifacts = resultingArtifacts
 
-            artifacts.update(newArtifacts)
+        return (newArtifacts, dependencyGavs)
 
-        return artifacts
+    def _runDependencyList(self, gav, repoUrls, include_scope):
+        """
+        Runs mvn dependency:list on the pom of the given GAV. Every run uses its own settings.xml and output file, so
+        more runs can be done concurrently.
+
+        :returns: list of GAVs of direct dependencies or None if the pom was not found or Maven failed
+        """
+        logging.debug("Resolving dependencies for %s", gav)
+        artifact = MavenArtifact.createFromGAV(gav)
+
+        pomFilename = 'poms/' + artifact.getPomFilename()
+        successPomUrl = None
+        fetched = False
+        for repoUrl in repoUrls:
+            pomUrl = maven_repo_util.slashAtTheEnd(repoUrl) + artifact.getPomFilepath()
+            fetched = maven_repo_util.fetchFile(pomUrl, pomFilename)
+            if fetched:
+                successPomUrl = repoUrl
+                break
+
+        if not fetched:
+            logging.warning("Failed to retrieve pom file for artifact %s", gav)
+            return None
+
+        tempDir = maven_repo_util.getTempDir()
+        if not os.path.exists(tempDir):
+            os.makedirs(tempDir)
+
+        # Create settings.xml
+        settingsFile = tempDir + "settings-" + gav + ".xml"
+        localRepository = self._getMavenLocalRepository()
+        settingsContent = self.SETTINGS_TPL.replace('${url}', successPomUrl) \
+                                           .replace('${localRepository}', localRepository)
+        with open(settingsFile, 'w') as settings:
+            settings.write(settingsContent)
+
+        # Build dependency:list
+        depsDir = tempDir + "maven-deps-output/"
+        outFile = depsDir + gav + ".out"
+        args = ['mvn', 'dependency:list', '-N',
+                                          '-DoutputFile=' + outFile,
+                                          '-f', pomFilename,
+                                          '-s', settingsFile]
+        if include_scope:
+            args.append("-DincludeScope=%s" % include_scope)
+        # the local repository, persistent or temporary, is shared by concurrent Maven processes, Maven 3.9+
+        # synchronizes them by file locks, older versions are run one at a time by _listDependencies
+        args.extend(["-Daether.syncContext.named.factory=file-lock",
+                     "-Daether.syncContext.named.nameMapper=file-gav"])
+        logging.debug("settings.xml contents: %s", settingsContent)
+        if self.configuration.useCache and self.configuration.mavenOffline:
+            returncode = self._runMaven(args + ["-o"])
+            if returncode != 0:
+                logging.debug("Offline Maven run failed for %s, probably some files are missing in the local "
+                              "repository %s, running Maven online", gav, localRepository)
+                returncode = self._runMaven(args)
+        else:
+            returncode = self._runMaven(args)
+
+        if returncode != 0:
+            logging.warning("Maven failed to finish with success. Skipping artifact %s", gav)
+            return None
+
+        with open(outFile, 'r') as out:
+            depLines = out.readlines()
+        gavList = self._parseDepList(depLines)
+        logging.debug("Resolved dependencies of %s: %s", gav, str(gavList))
+        return gavList
+
+    def _runMaven(self, args):
+        """Runs Maven with the given arguments and returns its return code."""
+        logging.debug("Running Maven:\n  %s", " ".join(args))
+        mvn = Popen(args, stdout=PIPE)
+        mvnStdout = mvn.communicate()[0]
+        logging.debug("Maven output:\n%s", mvnStdout)
+        return mvn.returncode
+
+    def _getMavenVersion(self):
+        """
+        Gets version of Maven run by dependency-list sources.
+
+        :returns: tuple (major, minor) of the Maven version or None if the version cannot be determined
+        """
+        try:
+            mvn = Popen(['mvn', '--version'], stdout=PIPE)
+        except OSError as ex:
+            logging.warning("Unable to run Maven: %s", str(ex))
+            return None
+        mvnStdout = mvn.communicate()[0]
+        match = re.search(r'Apache Maven (\d+)\.(\d+)', mvnStdout)
+        if mvn.returncode != 0 or not match:
+            logging.warning("Unable to determine Maven version from its output:\n%s", mvnStdout)
+            return None
+        return (int(match.group(1)), int(match.group(2)))
+
+    def _getMavenLocalRepository(self):
+        """
+        Gets path of the Maven local repository used for dependency-list sources. It is persistent and shared across
+        runs unless caches are disabled, then a repository in the temporary directory is used, which is removed at the
+        end of the run.
+        """
+        if self.configuration.useCache:
+            return os.path.abspath(self.configuration.mavenLocalRepository or self.MAVEN_LOCAL_REPOSITORY)
+        else:
+            return maven_repo_util.getTempDir() + ".m2/repository"
 
     def _listDependencyGraph(self, indyUrl, wsid, sourceKey, gavs, excludedSources=[], excludedSubgraphs=[],
                              preset="requires", mutator=None, patcherIds=[], injectedBOMs=[], analyze=False):
@@ -446,7 +721,8 @@ class ArtifactListBuilder:
 
             (extsAndClass, suffix) = self._getExtensionsAndClassifiers(artifactId, version, filenames)
 
-            self._addArtifact(artifacts, groupId, artifactId, version, extsAndClass, suffix, url)
+            self._addArtifact(artifacts, groupId, artifactId, version, extsAndClass, suffix, url,
+                              self._getFileManifest(filenames))
 
         if analyze:
             gas = []
@@ -523,13 +799,18 @@ class ArtifactListBuilder:
 
         return artifacts
 
-    def _listRepository(self, repoUrls, gavPatterns, gatcvs):
+    def _listRepository(self, repoUrls, gavPatterns, gatcvs, excludedGAVs=[], pruneVersions=False):
         """
         Loads maven artifacts from a repository.
 
         :param repoUrl: repository URL (local or remote, supported are [file://], http:// and
                         https:// urls)
         :param gavPatterns: list of patterns to filter by GAV
+        :param excludedGAVs: list of excluded GAV patterns, GAVs matching them are skipped already during the listing
+                             and directories containing only such GAVs are not listed at all
+        :param pruneVersions: if True, only the version which would be kept by single version filtering is listed
+                              in remote repositories for every GA with maven-metadata.xml, it is ignored when GATCVs
+                              are given
         :returns: Dictionary where index is MavenArtifact object and value is ArtifactSpec with its
                   repo root URL.
         """
@@ -540,22 +821,44 @@ class ArtifactListBuilder:
         else:
             prefixes = self._getPrefixes(gavPatterns)
             classifiersFilter = {}
-        artifacts = {}
+        # GATCV patterns exclude single files, they cannot be applied before the files are classified
+        pruner = PathPruner(maven_repo_util.splitGAVAndGATCVPatterns(excludedGAVs)[0])
+        for prefix in [prefix for prefix in prefixes if pruner.prunes(prefix)]:
+            logging.debug("Skipping listing of prefix '%s' containing only excluded GAVs", prefix)
+            prefixes.remove(prefix)
+        listings = []
         for repoUrl in reversed(repoUrls):
             urlWithSlash = maven_repo_util.slashAtTheEnd(repoUrl)
             protocol = maven_repo_util.urlProtocol(urlWithSlash)
-            if protocol == 'file':
+            repoIndex = maven_repo_util.loadRepositoryIndex(urlWithSlash, self.configuration.repositoryIndexTtl)
+            if repoIndex is not None:
+                logging.debug("Using index of repository %s instead of crawling it", urlWithSlash)
+                if protocol == 'http' or protocol == 'https':
+                    for prefix in prefixes:
+                        listings.append((self._listIndexedRepository,
+                                         [repoIndex, urlWithSlash, prefix, classifiersFilter, excludedGAVs]))
+                else:
+                    url = "file://" + (urlWithSlash[7:] if protocol == 'file' else urlWithSlash)
+                    for prefix in prefixes:
+                        listings.append((self._listIndexedRepository, [repoIndex, url, prefix, None, excludedGAVs]))
+            elif protocol == 'file':
                 for prefix in prefixes:
-                    artifacts.update(self._listLocalRepository(urlWithSlash[7:], prefix))
+                    listings.append((self._listLocalRepository, [urlWithSlash[7:], prefix, excludedGAVs]))
             elif protocol == '':
                 for prefix in prefixes:
-                    artifacts.update(self._listLocalRepository(urlWithSlash, prefix))
+                    listings.append((self._listLocalRepository, [urlWithSlash, prefix, excludedGAVs]))
             elif protocol == 'http' or protocol == 'https':
                 for prefix in prefixes:
-                    artifacts.update(self._listRemoteRepository(urlWithSlash, classifiersFilter, prefix))
+                    listings.append((self._listRemoteRepository,
+                                     [urlWithSlash, classifiersFilter, prefix, excludedGAVs, gavPatterns,
+                                      pruneVersions and not gatcvs]))
             else:
                 raise "Invalid protocol!", protocol
 
+        artifacts = {}
+        for listed in self._runListings(listings):
+            artifacts.update(listed)
+
         if gatcvs:
             artifacts = self._filterArtifactsByPatterns(artifacts, None, gatcvs)
         else:
@@ -564,6 +867,26 @@ class ArtifactListBuilder:
 
         return artifacts
 
+    def _runListings(self, listings):
+        """
+        Runs the listings concurrently using a bounded pool of threads.
+
+        :param listings: list of (function, args) tuples
+        :returns: list of results of the listings in the same order as the listings were given, so that merging
+                  them keeps the repository precedence
+        """
+        if len(listings) < 2:
+            return [function(*args) for (function, args) in listings]
+
+        pool = ThreadPool(min(self.MAX_LISTING_THREADS, len(listings)))
+        try:
+            results = [pool.apply_async(function, args) for (function, args) in listings]
+            pool.close()
+            return [result.get() for result in results]
+        finally:
+            pool.terminate()
+            pool.join()
+
     def _getPrefixesGatcvs(self, gatcvsList):
         # Match pattern ((?:groupId:)(?:artifactId:))(?:type:)?(?:classifier:)?(version)(?::scope)?
         _regexGATCVS = re.compile('((?:[\w\-.]+:){2})(?:[\w\-.]+:){0,2}([\d][\w\-.]+)(?::(?:compile|provided|runtime|test'
@@ -628,108 +951,304 @@ class ArtifactListBuilder:
                 prefixes.add(pattern)
         return prefixes
 
-    def _listRemoteRepository(self, repoUrl, classifiersFilter, prefix=""):
+    def _listRemoteRepository(self, repoUrl, classifiersFilter, prefix="", excludedGAVs=[], gavPatterns=None,
+                              pruneVersions=False):
         logging.debug("Listing remote repository %s prefix '%s'", repoUrl, prefix)
+        # ^./(groupId)/(artifactId)/(version)/(filename)$
+        regexGAVF = re.compile(r'\./(.+)/([^/]+)/([^/]+)/([^/]+\.[^/.]+)$')
+        gavExtClass = {}  # { (g,a,v): {ext: set([class])} }
+        suffixes = {}     # { (g,a,v): suffix }
+        gavFilenames = {}  # { (g,a,v): [filename] }
+        excluded = {}     # { (g,a,v): True if the GAV is excluded }
+        gavMatcher = maven_repo_util.getGAVAndGATCVMatchers(excludedGAVs)[0]
+        pruner = PathPruner(maven_repo_util.splitGAVAndGATCVPatterns(excludedGAVs)[0])
+        if pruner:
+            pruneDirectory = lambda relPath: pruner.prunes(prefix + relPath)
+        else:
+            pruneDirectory = None
+        deferredVersions = {} if pruneVersions else None
+
+        def parseLines(lines, linePrefix):
+            for line in lines:
+                if (line):
+                    line = "./" + linePrefix + line[2:]
+                    gavf = regexGAVF.match(line)
+                    if gavf is not None:
+                        groupId = gavf.group(1).replace('/', '.')
+                        artifactId = gavf.group(2)
+                        version = gavf.group(3)
+                        filename = gavf.group(4)
+
+                        if filename in self.IGNORED_REPOSITORY_FILES:
+                            continue
+
+                        gav = (groupId, artifactId, version)
+                        if gavMatcher:
+                            if gav not in excluded:
+                                excluded[gav] = gavMatcher.match("%s:%s:%s" % gav)
+                            if excluded[gav]:
+                                continue
+
+                        (extsAndClass, suffix) = self._getExtensionsAndClassifiers(artifactId, version, [filename])
+
+                        gavFilenames.setdefault(gav, []).append(filename)
+                        gavExtClass.setdefault(gav, {})
+                        self._updateExtensionsAndClassifiers(gavExtClass[gav], extsAndClass,
+                                                             classifiersFilter.get(gav))
+
+                        if suffix is not None and (gav not in suffixes or suffixes[gav] < suffix):
+                            suffixes[gav] = suffix
+
         try:
-            out = self._lftpFind(repoUrl + prefix)
+            # the listing is consumed line by line, only the per-GAV aggregation is kept in memory
+            parseLines(self._findFiles(repoUrl + prefix, cached=True, pruneDirectory=pruneDirectory,
+                                       variant=pruner.key + ("|versions" if pruneVersions else ""),
+                                       deferredVersions=deferredVersions), prefix)
+            if deferredVersions:
+                self._listSelectedVersions(repoUrl, prefix, deferredVersions, parseLines, excludedGAVs, gavPatterns,
+                                           gavExtClass)
         except IOError as err:
             if prefix:
                 logging.warning(str(err))
-                out = ""
+                return {}
             else:
                 raise err
 
-        # ^./(groupId)/(artifactId)/(version)/(filename)$
-        regexGAVF = re.compile(r'\./(.+)/([^/]+)/([^/]+)/([^/]+\.[^/.]+)$')
-        gavExtClass = {}  # { (g,a,v): {ext: set([class])} }
-        suffixes = {}     # { (g,a,v): suffix }
-        for line in out.split('\n'):
-            if (line):
-                line = "./" + prefix + line[2:]
-                gavf = regexGAVF.match(line)
-                if gavf is not None:
-                    groupId = gavf.group(1).replace('/', '.')
-                    artifactId = gavf.group(2)
-                    version = gavf.group(3)
-                    filename = gavf.group(4)
-
-                    if filename in self.IGNORED_REPOSITORY_FILES:
-                        continue
+        artifacts = {}
+        for gav in gavExtClass:
+            self._addArtifact(artifacts, gav[0], gav[1], gav[2], gavExtClass[gav], suffixes.get(gav), repoUrl,
+                              self._getFileManifest(gavFilenames[gav]))
+        return artifacts
+
+    def _listSelectedVersions(self, repoUrl, prefix, deferredVersions, parseLines, excludedGAVs, gavPatterns,
+                              gavExtClass):
+        """
+        Lists version directories deferred by the crawler. For every GA only the newest version, which would be kept
+        by single version filtering, is listed. If it would be dropped by exclusions, the next newest one is listed
+        and so on. All versions of GAs matching multi-version GA patterns are listed.
+
+        :param repoUrl: repository URL
+        :param prefix: listed prefix of the repository
+        :param deferredVersions: dictionary path of a GA directory relative to the prefix -> list of its version
+                                 directories which were not listed
+        :param parseLines: function parsing lines of a listing relative to the given path into gavExtClass
+        :param excludedGAVs: list of excluded GAV patterns
+        :param gavPatterns: list of included GAV patterns
+        :param gavExtClass: dictionary (g, a, v) -> {ext: set([class])} filled by parseLines
+        """
+        versionRanks = self._getVersionRanks(deferredVersions)
+        gavMatcher = maven_repo_util.getGAVAndGATCVMatchers(excludedGAVs)[0]
+        includedMatcher = maven_repo_util.getPatternMatcher(gavPatterns) if gavPatterns else None
+        multiVersionMatcher = maven_repo_util.getPatternMatcher(self.configuration.multiVersionGAs, False)
+        parseLock = Lock()
+
+        def listVersions(relPath, versions):
+            parts = (prefix + relPath).strip("/").split("/")
+            ga = "%s:%s" % (".".join(parts[:-1]), parts[-1])
+            candidates = [version for version in sorted(versions, key=versionRanks[relPath].get)
+                          if not gavMatcher.match("%s:%s" % (ga, version))
+                          and (includedMatcher is None or includedMatcher.match("%s:%s" % (ga, version)))]
+            allVersions = multiVersionMatcher.match(ga)
+            for version in candidates:
+                lines = list(self._findFiles(repoUrl + prefix + relPath + version + "/", cached=True))
+                with parseLock:
+                    parseLines(lines, prefix + relPath + version + "/")
+                    gav = (".".join(parts[:-1]), parts[-1], version)
+                    if not allVersions and gav in gavExtClass and self._survivesFilter(gav, gavExtClass[gav],
+                                                                                       excludedGAVs, repoUrl):
+                        logging.debug("Listed only version %s of %s", version, ga)
+                        return
+
+        pool = ThreadPool(maven_repo_util.MAX_THREADS)
+        try:
+            results = [pool.apply_async(listVersions, [relPath, versions])
+                       for (relPath, versions) in deferredVersions.iteritems()]
+            pool.close()
+            for result in results:
+                result.get()
+        finally:
+            pool.terminate()
+            pool.join()
 
-                    (extsAndClass, suffix) = self._getExtensionsAndClassifiers(artifactId, version, [filename])
+    def _getVersionRanks(self, versionLists):
+        """
+        Sorts versions of every GA in the same way as single version filtering does. To avoid running the version
+        sorter for every GA, versions of more GAs are sorted together in batches limited by MAX_VERSION_SORT_LENGTH
+        and the order of each GA is taken from its batch.
 
-                    gav = (groupId, artifactId, version)
+        :param versionLists: dictionary key of a GA -> list of its versions
+        :returns: dictionary key of a GA -> dictionary version -> rank, the newest version has rank 0
+        """
+        versionRanks = {}
+        batch = []
+        batchVersions = set()
+        batchLength = 0
+        for (key, versions) in sorted(versionLists.iteritems()):
+            if len(set(versions)) < 2:
+                versionRanks[key] = dict((version, 0) for version in versions)
+                continue
+            newVersions = set(versions) - batchVersions
+            newLength = sum(len(version) + 1 for version in newVersions)
+            if batch and batchLength + newLength > self.MAX_VERSION_SORT_LENGTH:
+                self._rankBatchVersions(batch, batchVersions, versionRanks)
+                batch = []
+                batchVersions = set()
+                newVersions = set(versions)
+                newLength = sum(len(version) + 1 for version in newVersions)
+                batchLength = 0
+            batch.append((key, versions))
+            batchVersions.update(newVersions)
+            batchLength += newLength
+        if batch:
+            self._rankBatchVersions(batch, batchVersions, versionRanks)
+        return versionRanks
+
+    def _rankBatchVersions(self, batch, batchVersions, versionRanks):
+        """
+        Sorts versions of a batch of GAs by one run of the version sorter and ranks versions of each GA by the order.
 
-                    gavExtClass.setdefault(gav, {})
-                    self._updateExtensionsAndClassifiers(gavExtClass[gav], extsAndClass, classifiersFilter.get(gav))
+        :param batch: list of tuples (key of a GA, list of its versions)
+        :param batchVersions: set of all versions of the batch
+        :param versionRanks: dictionary key of a GA -> dictionary version -> rank to be filled
+        """
+        order = maven_repo_util._sortVersionsWithAtlas(sorted(batchVersions))
+        # versions which the sorter rendered differently are ranked after the others
+        orderIndex = dict((version, index) for (index, version) in enumerate(order))
+        for (key, versions) in batch:
+            sortedVersions = sorted(set(versions), key=lambda version: (orderIndex.get(version, len(order)), version))
+            versionRanks[key] = dict((version, rank) for (rank, version) in enumerate(sortedVersions))
+
+    def _survivesFilter(self, gav, extsAndClass, excludedGAVs, url):
+        """
+        Checks if a GAV would be kept by filtering of excluded GAVs and excluded types.
 
-                    if suffix is not None and (gav not in suffixes or suffixes[gav] < suffix):
-                        suffixes[gav] = suffix
+        :param gav: tuple (groupId, artifactId, version)
+        :param extsAndClass: dictionary extension -> set of classifiers of the GAV
+        :param excludedGAVs: list of excluded GAV patterns of the source
+        :param url: repository URL
+        :returns: True if the GAV would be kept
+        """
+        artifacts = {}
+        self._addArtifact(artifacts, gav[0], gav[1], gav[2], copy.deepcopy(extsAndClass), None, url)
+        ga = "%s:%s" % gav[:2]
+        gaArtifacts = {0: dict((artifact.version, artSpec) for (artifact, artSpec) in artifacts.iteritems())}
+        listFilter = Filter(self.configuration)
+        listFilter._filterExcludedGAVsOfGA(ga, gaArtifacts, *maven_repo_util.getGAVAndGATCVMatchers(excludedGAVs))
+        if gaArtifacts and self.configuration.excludedTypes:
+            listFilter._filterExcludedTypesOfGA(ga, gaArtifacts,
+                                                maven_repo_util.getPatternMatcher(self.configuration.gatcvWhitelist),
+                                                set(self.configuration.excludedTypes))
+        return bool(gaArtifacts)
+
+    def _listIndexedRepository(self, repoIndex, url, prefix="", classifiersFilter=None, excludedGAVs=[]):
+        """
+        Loads maven artifacts from a repository index instead of crawling the repository.
+
+        :param repoIndex: list of (path, size, sha1, checksumTypes) tuples sorted by path as returned by
+                          maven_repo_util.loadRepositoryIndex()
+        :param url: repository URL stored in the created artifact specs
+        :param prefix: path prefix of listed files
+        :param classifiersFilter: filter applied on found classifiers in the same way as when listing a remote
+                                  repository, None means all found classifiers are added
+        :param excludedGAVs: list of excluded GAV patterns, matching GAVs are skipped
+        :returns: Dictionary where index is MavenArtifact object and value is ArtifactSpec with its
+                  repo root URL.
+        """
+        logging.debug("Listing repository index of %s prefix '%s'", url, prefix)
+        # (groupId)/(artifactId)/(version)/(filename)
+        regexGAVF = re.compile(r'(.+)/([^/]+)/([^/]+)/([^/]+)$')
+        gavFilenames = {}
+        gavFiles = {}  # { (g,a,v): {filename: {"checksumFiles": set([checksumType])}} or None if unknown }
+        for i in xrange(bisect.bisect_left(repoIndex, (prefix,)), len(repoIndex)):
+            (path, size, sha1, checksumTypes) = repoIndex[i]
+            if not path.startswith(prefix):
+                break
+            gavf = regexGAVF.match(path)
+            if gavf is not None and gavf.group(4) not in self.IGNORED_REPOSITORY_FILES:
+                gav = (gavf.group(1).replace('/', '.'), gavf.group(2), gavf.group(3))
+                gavFilenames.setdefault(gav, []).append(gavf.group(4))
+                files = gavFiles.setdefault(gav, {})
+                if checksumTypes is None or files is None:
+                    # indexes written by older versions do not record checksum files
+                    gavFiles[gav] = None
+                else:
+                    files[gavf.group(4)] = {"checksumFiles": checksumTypes & set(self.CHECKSUM_TYPES)}
 
+        gavMatcher = maven_repo_util.getGAVAndGATCVMatchers(excludedGAVs)[0]
         artifacts = {}
-        for gav in gavExtClass:
-            self._addArtifact(artifacts, gav[0], gav[1], gav[2], gavExtClass[gav], suffixes.get(gav), repoUrl)
+        for gav, filenames in gavFilenames.iteritems():
+            if gavMatcher and gavMatcher.match("%s:%s:%s" % gav):
+                continue
+            (extsAndClass, suffix) = self._getExtensionsAndClassifiers(gav[1], gav[2], filenames)
+            if classifiersFilter is not None:
+                filteredExtsAndClass = {}
+                self._updateExtensionsAndClassifiers(filteredExtsAndClass, extsAndClass, classifiersFilter.get(gav))
+                extsAndClass = filteredExtsAndClass
+            self._addArtifact(artifacts, gav[0], gav[1], gav[2], extsAndClass, suffix, url, gavFiles[gav])
         return artifacts
 
-    def _listLocalRepository(self, directoryPath, prefix=""):
+    def _listLocalRepository(self, directoryPath, prefix="", excludedGAVs=[]):
         """
         Loads maven artifacts from local directory.
 
         :param directoryPath: Path of the local directory.
+        :param excludedGAVs: list of excluded GAV patterns, matching GAVs are skipped and directories containing only
+                             such GAVs are not walked
         :returns: Dictionary where index is MavenArtifact object and value is ArtifactSpec with its
                   repo root URL starting with 'file://'.
         """
         logging.debug("Listing local repository %s prefix '%s'", directoryPath, prefix)
         artifacts = {}
-        # ^(groupId)/(artifactId)/(version)/?$
-        regexGAV = re.compile(r'^(.+)/([^/]+)/([^/]+)/?$')
-        for dirname, dirnames, filenames in os.walk(directoryPath + prefix, followlinks=True):
-            if filenames:
-                logging.debug("Looking for artifacts in %s", dirname)
-                gavPath = dirname.replace(directoryPath, '')
-                gav = regexGAV.search(gavPath)
-                #If gavPath is e.g. example/sth, then gav is None
-                if not gav:
-                    continue
-
-                # Remove first slash if present then convert to GroupId
-                groupId = re.sub("^/", "", gav.group(1)).replace('/', '.')
-                artifactId = gav.group(2)
-                version = gav.group(3)
-
-                filteredFilenames = list(set(filenames) - self.IGNORED_REPOSITORY_FILES)
-                if filteredFilenames:
-                    (extsAndClass, suffix) = self._getExtensionsAndClassifiers(artifactId, version, filteredFilenames)
-
-                    url = "file://" + directoryPath
-                    self._addArtifact(artifacts, groupId, artifactId, version, extsAndClass, suffix, url)
+        url = "file://" + directoryPath
+        walker = LocalDirectoryWalker()
+        gavMatcher = maven_repo_util.getGAVAndGATCVMatchers(excludedGAVs)[0]
+        pruner = PathPruner(maven_repo_util.splitGAVAndGATCVPatterns(excludedGAVs)[0])
+        for (gavPath, filenames) in walker.walk(maven_repo_util.slashAtTheEnd(directoryPath), prefix,
+                                                pruner.prunes if pruner else None):
+            # (groupId)/(artifactId)/(version), shallower paths like example/sth do not contain artifacts
+            gav = gavPath.rsplit("/", 2)
+            if len(gav) < 3 or not gav[0]:
+                continue
+            logging.debug("Looking for artifacts in %s%s", directoryPath, gavPath)
+            groupId = gav[0].replace('/', '.')
+            artifactId = gav[1]
+            version = gav[2]
+            if gavMatcher and gavMatcher.match("%s:%s:%s" % (groupId, artifactId, version)):
+                continue
+
+            filteredFilenames = [filename for filename in filenames
+                                 if filename not in self.IGNORED_REPOSITORY_FILES]
+            if filteredFilenames:
+                (extsAndClass, suffix) = self._getExtensionsAndClassifiers(artifactId, version, filteredFilenames)
+                self._addArtifact(artifacts, groupId, artifactId, version, extsAndClass, suffix, url)
 
         return artifacts
 
+    def _getFileManifest(self, filenames):
+        """
+        Creates files dictionary of ArtifactSpec from a complete list of files in a GAV directory. Every file
+        except checksum and signature files gets "checksumFiles" attribute with set of types of checksum files
+        present next to it.
+
+        :param filenames: list of all filenames in the GAV directory
+        :returns: dictionary {filename: {"checksumFiles": set([checksumType])}}
+        """
+        filenameSet = set(filenames)
+        files = {}
+        for filename in filenameSet:
+            if not filename.endswith(self.SIDECAR_EXTENSIONS):
+                files[filename] = {"checksumFiles": set([checksumType for checksumType in self.CHECKSUM_TYPES
+                                                         if filename + "." + checksumType in filenameSet])}
+        return files
+
     def _getExtensionsAndClassifiers(self, artifactId, version, filenames):
         # returns ({ext: set([classifier])}, suffix)
-        av = self._getArtifactVersionREString(artifactId, version)
-        # artifactId-(version)-(classifier).(extension)
-        #                          (classifier)   (   extension   )
-        checksumRegEx = re.compile(av + ".+\.(md5|sha1|sha256|asc)$")
-        ceRegEx1 = re.compile(av + "(?:-(.+))?\.(tar\.[^.]+)$")
-        ceRegEx2 = re.compile(av + "(?:-(.+))?\.([^.]+)$")
-
         suffix = None
         extensions = {}
         for filename in filenames:
-            cs = checksumRegEx.match(filename)
-            if cs:
-                # the file is a checksum, not an artifact
-                continue
-
-            ce = ceRegEx1.match(filename)
-            if not ce:
-                ce = ceRegEx2.match(filename)
-            if ce:
-                realVersion = ce.group(1)
-                classifier = ce.group(2)
-                ext = ce.group(3)
+            parsed = self._parseFilename(artifactId, version, filename)
+            if parsed:
+                (realVersion, classifier, ext) = parsed
 
                 extensions.setdefault(ext, set())
                 if classifier is None:
@@ -742,7 +1261,115 @@ class ArtifactListBuilder:
                         suffix = realVersion
         return (extensions, suffix)
 
-    def _addArtifact(self, artifacts, groupId, artifactId, version, extsAndClass, suffix, url):
+    def _parseFilename(self, artifactId, version, filename):
+        """
+        Parses filename in form artifactId-version[-classifier].extension. It is called for every listed file, so
+        common filenames are parsed by string operations and only unusual ones by regular expressions.
+
+        :returns: tuple (real version, classifier or None, extension) or None if the file is a checksum or its name
+                  does not match the artifact
+        """
+        snapshot = version.endswith("-SNAPSHOT")
+        if "\n" in filename or (snapshot and (version.count("SNAPSHOT") > 1
+                                              or not self._plainVersionRegEx.match(version))):
+            return self._parseFilenameWithRegExps(artifactId, version, filename)
+
+        if snapshot:
+            prefix = artifactId + "-" + version[:-len("SNAPSHOT")]
+        else:
+            prefix = artifactId + "-" + version
+        if not filename.startswith(prefix):
+            # dots in snapshot version pattern match any character
+            return self._parseFilenameWithRegExps(artifactId, version, filename) if snapshot else None
+        rest = filename[len(prefix):]
+
+        # a longer build number of a timestamped snapshot can be shortened to make a checksum filename match
+        shortenable = False
+        if not snapshot:
+            realVersion = version
+        elif rest.startswith("SNAPSHOT"):
+            realVersion = "SNAPSHOT"
+            rest = rest[len("SNAPSHOT"):]
+        else:
+            # (timestamp).(time)-(build number)
+            dot = self._skipDigits(rest, 0)
+            if dot == 0 or not rest.startswith(".", dot):
+                return None
+            dash = self._skipDigits(rest, dot + 1)
+            if dash == dot + 1 or not rest.startswith("-", dash):
+                return None
+            end = self._skipDigits(rest, dash + 1)
+            if end == dash + 1:
+                return None
+            shortenable = end - dash > 2
+            realVersion = rest[:end]
+            rest = rest[end:]
+
+        for checksumExt in self.CHECKSUM_EXTENSIONS:
+            if rest.endswith(checksumExt) and (len(rest) > len(checksumExt) or shortenable):
+                # the file is a checksum, not an artifact
+                return None
+
+        dot = rest.rfind(".")
+        if dot == -1 or dot == len(rest) - 1:
+            return None
+        ext = rest[dot + 1:]
+        head = rest[:dot]
+        if head.endswith(".tar"):
+            tarHead = head[:-len(".tar")]
+            if not tarHead:
+                return (realVersion, None, "tar." + ext)
+            if tarHead.startswith("-") and len(tarHead) > 1:
+                return (realVersion, tarHead[1:], "tar." + ext)
+        if not head:
+            return (realVersion, None, ext)
+        if head.startswith("-") and len(head) > 1:
+            return (realVersion, head[1:], ext)
+        return None
+
+    def _skipDigits(self, string, start):
+        """Returns index of the first non-digit character in string from position start."""
+        end = start
+        while end < len(string) and string[end].isdigit():
+            end += 1
+        return end
+
+    def _parseFilenameWithRegExps(self, artifactId, version, filename):
+        """Regular expression variant of _parseFilename() used for unusual versions and filenames."""
+        (checksumRegEx, ceRegEx1, ceRegEx2) = self._getFilenameRegExps(artifactId, version)
+        if checksumRegEx.match(filename):
+            # the file is a checksum, not an artifact
+            return None
+
+        ce = ceRegEx1.match(filename)
+        if not ce:
+            ce = ceRegEx2.match(filename)
+        if ce:
+            return (ce.group(1), ce.group(2), ce.group(3))
+        return None
+
+    def _getFilenameRegExps(self, artifactId, version):
+        """
+        Gets compiled regular expressions classifying filenames of the given artifact and version. They are cached,
+        because listings are parsed file by file and the same artifact and version repeat for many lines.
+
+        :returns: tuple (checksum regexp, tar.* classifier and extension regexp, classifier and extension regexp)
+        """
+        key = (artifactId, version)
+        regExps = self._filenameRegExpsCache.get(key)
+        if regExps is None:
+            av = self._getArtifactVersionREString(artifactId, version)
+            # artifactId-(version)-(classifier).(extension)
+            #                          (classifier)   (   extension   )
+            regExps = (re.compile(av + ".+\.(md5|sha1|sha256|asc)$"),
+                       re.compile(av + "(?:-(.+))?\.(tar\.[^.]+)$"),
+                       re.compile(av + "(?:-(.+))?\.([^.]+)$"))
+            if len(self._filenameRegExpsCache) >= self.MAX_CACHED_FILENAME_REGEXPS:
+                self._filenameRegExpsCache.clear()
+            self._filenameRegExpsCache[key] = regExps
+        return regExps
+
+    def _addArtifact(self, artifacts, groupId, artifactId, version, extsAndClass, suffix, url, files=None):
         pomMain = True
         # The pom is main only if no other main artifact is available
         if len(extsAndClass) > 1 and self._containsMainArtifact(extsAndClass) and "pom" in extsAndClass:
@@ -762,11 +1389,16 @@ class ArtifactListBuilder:
         mavenArtifact = MavenArtifact(groupId, artifactId, None, version)
         if suffix is not None:
             mavenArtifact.snapshotVersionSuffix = suffix
+        artSpec = ArtifactSpec(url, artTypes)
+        if files:
+            artSpec.files.update(files)
+            maven_repo_util.recordListedFiles(maven_repo_util.slashAtTheEnd(url) + mavenArtifact.getDirPath(),
+                                              files.keys())
         if mavenArtifact in artifacts:
-            artifacts[mavenArtifact].merge(ArtifactSpec(url, artTypes))
+            artifacts[mavenArtifact].merge(artSpec)
         else:
             logging.debug("Adding artifact %s", str(mavenArtifact))
-            artifacts[mavenArtifact] = ArtifactSpec(url, artTypes)
+            artifacts[mavenArtifact] = artSpec
 
     def _containsMainArtifact(self, extsAndClass):
         """
@@ -911,11 +1543,12 @@ class ArtifactListBuilder:
                         artTypes[ext] = artType
                 if extContainsMain:
                     artSpecToAdd = ArtifactSpec(artSpec.url, artTypes)
+                    artSpecToAdd.files = artSpec.files
                     includedArtifacts[artifact] = artSpecToAdd
         else:
-            regExps = maven_repo_util.getRegExpsFromStrings(gavPatterns)
+            matcher = maven_repo_util.getPatternMatcher(gavPatterns)
             for artifact in artifacts.keys():
-                if maven_repo_util.somethingMatch(regExps, artifact.getGAV()):
+                if matcher.match(artifact.getGAV()):
                     includedArtifacts[artifact] = artifacts[artifact]
         return includedArtifacts
 
@@ -934,23 +1567,41 @@ class ArtifactListBuilder:
 
         return result
 
-    def _lftpFind(self, url):
-        if maven_repo_util.urlExists(url):
-            lftp = Popen(r'lftp -c "set ssl:verify-certificate no ; open ' + url
-                         + ' && find  ."', stdout=PIPE, shell=True)
-            result = lftp.communicate()[0]
-            if lftp.returncode:
-                raise IOError("lftp find in %s ended by return code %d" % (url, lftp.returncode))
-            else:
-                return result
+    def _findFiles(self, url, maxDepth=None, cached=False, pruneDirectory=None, variant="", deferredVersions=None):
+        """
+        Lists files in the given URL recursively by crawling its HTML index pages in parallel.
+
+        :param url: URL to list
+        :param maxDepth: maximum depth of listed entries, None means unlimited
+        :param cached: whether the listing should be stored in the listing cache and revalidated from it on next runs,
+                       it is ignored when caches are disabled in the configuration
+        :param pruneDirectory: function returning True for paths of directories relative to the URL which should not
+                               be listed, None means all directories are listed
+        :param variant: string identifying pruneDirectory and deferring of versions in the listing cache
+        :param deferredVersions: dictionary filled with directories containing maven-metadata.xml -> their version
+                                 subdirectories which are not listed, None means all subdirectories are listed
+        :returns: iterator over lines of the listing in "find" format, the lines come as soon as their directories
+                  are listed, IOError is raised at the end of iteration if listing of any directory fails
+        """
+        if cached and self.configuration.useCache:
+            ttl = self.configuration.listingCacheTtl
+            if ttl is None:
+                ttl = ListingCache.DEFAULT_TTL
+            cache = ListingCache(ttl=ttl, variant=variant)
         else:
-            raise IOError("Cannot list URL %s. The URL does not exist." % url)
+            cache = None
+        crawler = HttpDirectoryCrawler(maxDepth=maxDepth, cache=cache, pruneDirectory=pruneDirectory,
+                                       deferredVersions=deferredVersions)
+        return crawler.find(url)
 
 
 class ArtifactSpec():
     """
     Specification of artifact location and contents. The artTypes is a dictionary with type as a key and an
-    ArtifactType instance as a value. It is automatically created if the provided value is a list.
+    ArtifactType instance as a value. It is automatically created if the provided value is a list. The files is
+    a dictionary with filenames as keys and dictionaries of file attributes known from the artifact source as values,
+    i.e. "size", checksums keyed by their type (md5, sha1 or sha256) and "checksumFiles", the set of checksum types
+    whose files exist in the repository, when the source lists whole GAV directories.
     """
 
     def __init__(self, url, artTypes):
@@ -968,6 +1619,7 @@ class ArtifactSpec():
             for artType in artTypes:
                 self.artTypes[artType.artType] = artType
         self.paths = []
+        self.files = {}
 
     def merge(self, other):
         if other.url and self.url != other.url:
@@ -980,6 +1632,7 @@ class ArtifactSpec():
 
         self.artTypes.update(other.artTypes)
         self.paths.extend(other.paths)
+        self.files.update(other.files)
 
     def add_path(self, path):
         """
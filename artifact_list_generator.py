@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+import copy
 import reporter
 import logging
 import optparse
@@ -37,6 +38,27 @@ def main():
         action='store_false',
         help='Don\'t use any cache (dependency graph cache etc.).'
     )
+    cliOptParser.add_option(
+        '--nonegativecache',
+        dest="negativeCache",
+        default=True,
+        action='store_false',
+        help='Request again also the URLs which were found missing in the previous runs and refresh the cache of '
+             'missing URLs.'
+    )
+    cliOptParser.add_option(
+        '--filtertrace',
+        dest="filterTrace",
+        help='Name of a JSON file in which a trace of the artifact list filtering should be written. It contains wall '
+             'time and numbers of GAVs and GATCVs entering and leaving each filtering stage.'
+    )
+    cliOptParser.add_option(
+        '--filtertracereasons',
+        dest="filterTraceReasons",
+        default=False,
+        action='store_true',
+        help='Write also every dropped item with the reason of its removal in the filter trace.'
+    )
     cliOptParser.add_option(
         '-w', '--whitelist',
         help='Name of a file containing GATCV patterns allowing usage of stars or regular expressions when enclosed '
@@ -99,6 +121,11 @@ def generateArtifactList(options, args):
                         else:
                             gatcv = "%s:%s:%s" % (ga, artType, version)
                         artifact = MavenArtifact.createFromGAV(gatcv)
+                        fileInfo = artSpec.files.get(artifact.getArtifactFilename())
+                        if fileInfo:
+                            # instances created from GAV are shared, the file info belongs to this source only
+                            artifact = copy.copy(artifact)
+                            artifact.fileInfo = fileInfo
                         urlToMAList.setdefault(url, []).append(artifact)
     return urlToMAList
 
@@ -115,6 +142,9 @@ def _generateArtifactList(options, args):
         logging.info("Creating configuration...")
         config.create(options, args)
 
+    if config.useCache:
+        maven_repo_util.configureNegativeCache(config.negativeCacheTtl, lookup=config.useNegativeCache)
+
     # build list
     logging.info("Building artifact list...")
     listBuilder = ArtifactListBuilder(config)
@@ -0,0 +1,385 @@
+#!/usr/bin/env python
+
+"""benchmarks.py: Micro-benchmarks of performance sensitive parts of maven repo builder and related tools"""
+
+import BaseHTTPServer
+import copy
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import SimpleHTTPServer
+import SocketServer
+import sys
+import tempfile
+import threading
+import time
+import urllib
+from distutils.spawn import find_executable
+from subprocess import Popen
+from subprocess import PIPE
+
+import maven_repo_util
+from artifact_list_builder import ArtifactListBuilder
+from artifact_list_builder import ArtifactSpec
+from artifact_list_builder import ArtifactType
+from configuration import Configuration
+from filter import Filter
+from pattern_matcher import PatternMatcher
+from repository_crawler import HttpDirectoryCrawler
+
+
+def _measure(name, function, repeat=3):
+    """Runs the function repeatedly and prints the best wall time."""
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        function()
+        duration = time.time() - start
+        if best is None or duration < best:
+            best = duration
+    print "%-50s %10.3f s" % (name, best)
+    return best
+
+
+class _RegExpArtifactListBuilder(ArtifactListBuilder):
+    """Builder classifying filenames by cached regular expressions only."""
+
+    def _parseFilename(self, artifactId, version, filename):
+        return self._parseFilenameWithRegExps(artifactId, version, filename)
+
+
+class _UncachedArtifactListBuilder(_RegExpArtifactListBuilder):
+    """Builder compiling the filename regular expressions on every call as it was done originally."""
+
+    def _getFilenameRegExps(self, artifactId, version):
+        av = self._getArtifactVersionREString(artifactId, version)
+        return (re.compile(av + ".+\.(md5|sha1|sha256|asc)$"),
+                re.compile(av + "(?:-(.+))?\.(tar\.[^.]+)$"),
+                re.compile(av + "(?:-(.+))?\.([^.]+)$"))
+
+
+class _OsWalkArtifactListBuilder(ArtifactListBuilder):
+    """Builder listing local repositories by a single os.walk as it was done originally."""
+
+    def _listLocalRepository(self, directoryPath, prefix=""):
+        artifacts = {}
+        regexGAV = re.compile(r'^(.+)/([^/]+)/([^/]+)/?$')
+        for dirname, dirnames, filenames in os.walk(directoryPath + prefix, followlinks=True):
+            if filenames:
+                gav = regexGAV.search(dirname.replace(directoryPath, ''))
+                if not gav:
+                    continue
+                groupId = re.sub("^/", "", gav.group(1)).replace('/', '.')
+                filteredFilenames = list(set(filenames) - self.IGNORED_REPOSITORY_FILES)
+                if filteredFilenames:
+                    (extsAndClass, suffix) = self._getExtensionsAndClassifiers(gav.group(2), gav.group(3),
+                                                                               filteredFilenames)
+                    self._addArtifact(artifacts, groupId, gav.group(2), gav.group(3), extsAndClass, suffix,
+                                      "file://" + directoryPath)
+        return artifacts
+
+
+class _QuadraticDuplicatesFilter(Filter):
+    """Filter comparing every version with all lower priorities as it was done originally."""
+
+    def _filterDuplicatesOfGA(self, ga, gaArtifacts):
+        dropped = 0
+        for priority in sorted(gaArtifacts.keys()):
+            for version in gaArtifacts[priority].keys():
+                for pr in gaArtifacts.keys():
+                    if pr <= priority:
+                        continue
+                    if version in gaArtifacts[pr]:
+                        if len(gaArtifacts[pr][version].paths):
+                            gaArtifacts[priority][version].paths.extend(gaArtifacts[pr][version].paths)
+                        del gaArtifacts[pr][version]
+                        dropped += 1
+            if not gaArtifacts[priority]:
+                del gaArtifacts[priority]
+        return dropped
+
+
+def _listingFilenames(gavCount):
+    """Generates (artifactId, version, filename) triples as they come from a repository listing."""
+    result = []
+    for i in range(gavCount):
+        artifactId = "artifact-%d" % (i % 500)
+        version = "1.%d.0-redhat-%d" % (i / 500, i % 7)
+        base = "%s-%s" % (artifactId, version)
+        for filename in (base + ".pom", base + ".jar", base + "-sources.jar", base + "-javadoc.jar",
+                         base + "-dist.tar.gz"):
+            for checksum in ("", ".md5", ".sha1"):
+                result.append((artifactId, version, filename + checksum))
+    return result
+
+
+def bench_getExtensionsAndClassifiers(gavCount=20000):
+    config = Configuration()
+    config.addClassifiers = "__all__"
+    filenames = _listingFilenames(gavCount)
+
+    def classify(builder):
+        def run():
+            for (artifactId, version, filename) in filenames:
+                builder._getExtensionsAndClassifiers(artifactId, version, [filename])
+        return run
+
+    print "Classifying %d filenames one by one" % len(filenames)
+    uncached = _measure("  regexps compiled on every call", classify(_UncachedArtifactListBuilder(config)))
+    cached = _measure("  cached regexps", classify(_RegExpArtifactListBuilder(config)))
+    parsed = _measure("  string parsing", classify(ArtifactListBuilder(config)))
+    print "  speedup: %.1fx with cached regexps, %.1fx with string parsing" % (uncached / cached, uncached / parsed)
+
+
+def _generateRepository(repoDir, groupCount, artifactCount, versionCount):
+    """Creates an empty file tree of a repository with groupCount * artifactCount * versionCount GAVs."""
+    for g in range(groupCount):
+        for a in range(artifactCount):
+            artifactDir = os.path.join(repoDir, "org", "group%d" % g, "artifact-%d" % a)
+            for v in range(versionCount):
+                versionDir = os.path.join(artifactDir, "1.%d" % v)
+                os.makedirs(versionDir)
+                for ext in ("pom", "jar", "pom.sha1", "jar.sha1"):
+                    open(os.path.join(versionDir, "artifact-%d-1.%d.%s" % (a, v, ext)), "w").close()
+            open(os.path.join(artifactDir, "maven-metadata.xml"), "w").close()
+
+
+def _startLatencyServer(repoDir, latency):
+    """Starts a threaded HTTP server listing repoDir, every request is delayed by latency seconds."""
+
+    class Handler(SimpleHTTPServer.SimpleHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def translate_path(self, path):
+            return repoDir + urllib.unquote(path.split("?", 1)[0])
+
+        def send_head(self):
+            time.sleep(latency)
+            return SimpleHTTPServer.SimpleHTTPRequestHandler.send_head(self)
+
+        def log_message(self, *args):
+            pass
+
+    class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+        daemon_threads = True
+        request_queue_size = 64
+
+    server = Server(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def bench_crawler(groupCount=5, artifactCount=20, versionCount=3, latency=0.02):
+    repoDir = tempfile.mkdtemp(prefix="crawler-bench-")
+    _generateRepository(repoDir, groupCount, artifactCount, versionCount)
+    server = _startLatencyServer(repoDir, latency)
+    url = "http://127.0.0.1:%d/" % server.server_address[1]
+
+    def crawl(maxThreads):
+        def run():
+            for _ in HttpDirectoryCrawler(maxThreads=maxThreads).find(url):
+                pass
+        return run
+
+    def lftpFind():
+        lftp = Popen(r'lftp -c "open ' + url + ' && find  ."', stdout=PIPE, shell=True)
+        lftp.communicate()
+
+    try:
+        print "Crawling %d GAV directories with %d ms latency per request" % (
+            groupCount * artifactCount * versionCount, latency * 1000)
+        if find_executable("lftp"):
+            _measure("  lftp find", lftpFind, repeat=1)
+        else:
+            print "  lftp find                                          skipped, lftp not found"
+        sequential = _measure("  crawler, 1 thread", crawl(1), repeat=1)
+        parallel = _measure("  crawler, %d threads" % maven_repo_util.MAX_THREADS,
+                            crawl(maven_repo_util.MAX_THREADS), repeat=1)
+        print "  speedup: %.1fx with parallel crawling" % (sequential / parallel)
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(repoDir)
+
+
+def bench_excludedCrawl(groupCount=5, artifactCount=20, versionCount=5, excludedGroups=4, latency=0.02):
+    repoDir = tempfile.mkdtemp(prefix="crawler-bench-")
+    _generateRepository(repoDir, groupCount, artifactCount, versionCount)
+    server = _startLatencyServer(repoDir, latency)
+    url = "http://127.0.0.1:%d/" % server.server_address[1]
+    config = Configuration()
+    config.useCache = False
+    excludedGAVs = ["org.group%d*" % g for g in range(excludedGroups)]
+
+    def listing(excluded):
+        def run():
+            ArtifactListBuilder(config)._listRepository([url], None, None, excluded)
+        return run
+
+    try:
+        print "Listing %d GAVs with %d ms latency per request, %d of %d groupIds excluded" % (
+            groupCount * artifactCount * versionCount, latency * 1000, excludedGroups, groupCount)
+        filtered = _measure("  exclusions applied after the listing", listing([]), repeat=1)
+        pruned = _measure("  exclusions pushed down into the listing", listing(excludedGAVs), repeat=1)
+        print "  speedup: %.1fx" % (filtered / pruned)
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(repoDir)
+
+
+def bench_localRepository(groupCount=20, artifactCount=50, versionCount=5, latency=0.001):
+    repoDir = tempfile.mkdtemp(prefix="walker-bench-") + "/"
+    _generateRepository(repoDir, groupCount, artifactCount, versionCount)
+    config = Configuration()
+    config.addClassifiers = "__all__"
+    listdir = os.listdir
+
+    def slowListdir(path):
+        time.sleep(latency)
+        return listdir(path)
+
+    def listing(builder):
+        def run():
+            builder._listLocalRepository(repoDir)
+        return run
+
+    try:
+        for (title, repeat) in (("local disk", 3), ("%d ms latency per directory read" % (latency * 1000), 1)):
+            print "Listing local repository with %d GAVs, %s" % (groupCount * artifactCount * versionCount, title)
+            _measure("  os.walk", listing(_OsWalkArtifactListBuilder(config)), repeat)
+            _measure("  LocalDirectoryWalker, %d threads" % maven_repo_util.MAX_THREADS,
+                     listing(ArtifactListBuilder(config)), repeat)
+            # os.walk and the walker without scandir read directories by os.listdir
+            os.listdir = slowListdir
+    finally:
+        os.listdir = listdir
+        shutil.rmtree(repoDir)
+
+
+def bench_patternMatcher(patternCount=2000, gavCount=20000):
+    patterns = []
+    for i in range(patternCount):
+        if i % 10 == 0:
+            patterns.append("org.group%d:*:1.%d" % (i % 300, i))
+        elif i % 50 == 1:
+            patterns.append("r/org\\.regexp%d:.*/" % i)
+        else:
+            patterns.append("org.group%d:artifact-%d:1.%d" % (i % 300, i, i))
+    gavs = ["org.group%d:artifact-%d:1.%d" % (i % 500, i % 3000, i % 7) for i in range(gavCount)]
+
+    def matchRegExps():
+        regExps = maven_repo_util.getRegExpsFromStrings(patterns)
+        for gav in gavs:
+            maven_repo_util.somethingMatch(regExps, gav)
+
+    def matchPatternMatcher():
+        matcher = PatternMatcher(patterns)
+        for gav in gavs:
+            matcher.match(gav)
+
+    print "Matching %d GAVs against %d excluded GAV patterns" % (gavCount, patternCount)
+    regExps = _measure("  list of regular expressions", matchRegExps, repeat=1)
+    matcher = _measure("  PatternMatcher", matchPatternMatcher)
+    print "  speedup: %.1fx" % (regExps / matcher)
+
+
+def _overlappingArtifactList(sourceCount, gaCount, versionCount):
+    """Creates artifactList in which every source shares two versions of every GA with the next source."""
+    artifactList = {}
+    for g in range(gaCount):
+        ga = "org.group%d:artifact-%d" % (g % 50, g)
+        artifactList[ga] = {}
+        for priority in range(1, sourceCount + 1):
+            versions = ["1.%d" % (priority * (versionCount - 2) + v) for v in range(versionCount)]
+            artifactList[ga][priority] = dict((version, ArtifactSpec("http://repo%d.example.com/" % priority,
+                                                                     [ArtifactType("jar", True, set([""]))]))
+                                              for version in versions)
+    return artifactList
+
+
+def bench_filterDuplicates(sourceCounts=(50, 100, 200), gaCount=500, versionCount=5):
+    for sourceCount in sourceCounts:
+        artifactList = _overlappingArtifactList(sourceCount, gaCount, versionCount)
+
+        def copyList():
+            # specs are shared, only the dictionaries are modified by the filter
+            return dict((ga, dict((priority, dict(versions)) for (priority, versions) in priorities.iteritems()))
+                        for (ga, priorities) in artifactList.iteritems())
+
+        def filterDuplicates(listFilter):
+            def run():
+                listFilter._filterDuplicates(copyList())
+            return run
+
+        print "Filtering duplicates of %d GAs with %d versions in each of %d artifact sources" % (
+            gaCount, versionCount, sourceCount)
+        copying = _measure("  copying of the artifact list", copyList)
+        quadratic = _measure("  comparison with all lower priorities",
+                             filterDuplicates(_QuadraticDuplicatesFilter(Configuration())))
+        linear = _measure("  single sweep", filterDuplicates(Filter(Configuration())))
+        print "  speedup: %.1fx without copying" % ((quadratic - copying) / (linear - copying))
+
+
+def _largeArtifactList(gaCount, sourceCount):
+    artifactList = {}
+    for g in range(gaCount):
+        ga = "org.group%d:artifact-%d" % (g % 50, g)
+        artifactList[ga] = {}
+        for priority in range(1, sourceCount + 1):
+            artifactList[ga][priority] = dict(
+                ("1.%d" % ((priority + v) % 5), ArtifactSpec("http://repo%d.example.com/" % priority, [
+                    ArtifactType("jar", True, set(["", "sources", "javadoc"])), ArtifactType("pom", False, set([""])),
+                    ArtifactType("zip", False, set(["dist"]))]))
+                for v in range(3))
+    return artifactList
+
+
+def bench_filterProcesses(gaCount=20000, sourceCount=2):
+    config = Configuration()
+    config.excludedGAVs = ["org.group%d:*:1.%d" % (g, g % 5) for g in range(0, 50, 3)] + ["*:*:jar:javadoc:*"]
+    config.excludedTypes = ["war", "zip"]
+    config.singleVersion = False
+
+    def filterList(processes):
+        artifactList = _largeArtifactList(gaCount, sourceCount)
+        listFilter = Filter(config)
+        listFilter.MAX_PROCESSES = processes
+        start = time.time()
+        listFilter.filter(artifactList)
+        duration = time.time() - start
+        print "%-50s %10.3f s" % ("  %d process(es)" % processes, duration)
+        return duration
+
+    print "Filtering %d GAs with %d versions in each of %d artifact sources on %d CPUs" % (
+        gaCount, 3, sourceCount, multiprocessing.cpu_count())
+    sequential = filterList(1)
+    parallel = filterList(max(2, Filter.MAX_PROCESSES))
+    print "  speedup: %.1fx" % (sequential / parallel)
+
+
+BENCHMARKS = {
+    "crawler": bench_crawler,
+    "excludedCrawl": bench_excludedCrawl,
+    "localRepository": bench_localRepository,
+    "getExtensionsAndClassifiers": bench_getExtensionsAndClassifiers,
+    "patternMatcher": bench_patternMatcher,
+    "filterDuplicates": bench_filterDuplicates,
+    "filterProcesses": bench_filterProcesses,
+}
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+    names = sys.argv[1:] or sorted(BENCHMARKS.keys())
+    for name in names:
+        BENCHMARKS[name]()
+
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,18 @@ from maven_repo_util import ChecksumMode
 
 def compareArtifacts(localRepoPath, remoteUrl):
     tempDownloadDir = tempfile.mkdtemp()
+    localIndex = maven_repo_util.loadRepositoryIndex(localRepoPath)
+    if localIndex is not None:
+        logging.info('Using index of local repository %s', localRepoPath)
+        remoteIndex = maven_repo_util.loadRepositoryIndex(remoteUrl)
+        if remoteIndex is not None:
+            logging.info('Using index of remote repository %s', remoteUrl)
+            _compareIndexes(localIndex, remoteIndex)
+        else:
+            for (relRepoPath, size, sha1, checksumTypes) in localIndex:
+                _compareArtifact(relRepoPath, sha1, remoteUrl, tempDownloadDir)
+        return
+
     regexChecksum = re.compile('(\.sha1$)|(\.md5$)')
     regexMetadata = re.compile('(maven-metadata.xml)|(\.lastUpdated$)|(_maven.repositories)')
     for root, dirs, files in os.walk(localRepoPath, followlinks=True):
@@ -25,24 +37,39 @@ def compareArtifacts(localRepoPath, remoteUrl):
                 continue
             filepath = os.path.join(root, filename)
             relRepoPath = os.path.relpath(filepath, localRepoPath)
-            logging.debug('Checking artifact: %s', relRepoPath)
-
-            # Attempt to download remote artifact
-            tempDownloadFile = os.path.join(tempDownloadDir, relRepoPath)
-            remoteFileUrl = remoteUrl + "/" + relRepoPath
-            try:
-                maven_repo_util.download(remoteFileUrl, tempDownloadFile, ChecksumMode.generate)
-            except Exception:
-                logging.error("An error occured while downloading %s", remoteFileUrl)
-
-            # Compare the local and remote artifact checksums
-            if os.path.exists(tempDownloadFile):
-                localFileChecksum = maven_repo_util.getSha1Checksum(filepath)
-                remoteFileChecksum = maven_repo_util.getSha1Checksum(tempDownloadFile)
-                if (localFileChecksum != remoteFileChecksum):
-                    logging.error('Checksums do not match for artifact %s', relRepoPath)
-            else:
-                logging.debug('File does not exist in remote repo: %s', relRepoPath)
+            if relRepoPath == maven_repo_util.REPOSITORY_INDEX_FILENAME:
+                continue
+            _compareArtifact(relRepoPath, maven_repo_util.getSha1Checksum(filepath), remoteUrl, tempDownloadDir)
+
+
+def _compareArtifact(relRepoPath, localFileChecksum, remoteUrl, tempDownloadDir):
+    logging.debug('Checking artifact: %s', relRepoPath)
+
+    # Attempt to download remote artifact
+    tempDownloadFile = os.path.join(tempDownloadDir, relRepoPath)
+    remoteFileUrl = remoteUrl + "/" + relRepoPath
+    try:
+        maven_repo_util.download(remoteFileUrl, tempDownloadFile, ChecksumMode.generate)
+    except Exception:
+        logging.error("An error occured while downloading %s", remoteFileUrl)
+
+    # Compare the local and remote artifact checksums
+    if os.path.exists(tempDownloadFile):
+        remoteFileChecksum = maven_repo_util.getSha1Checksum(tempDownloadFile)
+        if (localFileChecksum != remoteFileChecksum):
+            logging.error('Checksums do not match for artifact %s', relRepoPath)
+    else:
+        logging.debug('File does not exist in remote repo: %s', relRepoPath)
+
+
+def _compareIndexes(localIndex, remoteIndex):
+    remoteChecksums = dict((path, sha1) for (path, size, sha1, checksumTypes) in remoteIndex)
+    for (relRepoPath, size, sha1, checksumTypes) in localIndex:
+        logging.debug('Checking artifact: %s', relRepoPath)
+        if relRepoPath not in remoteChecksums:
+            logging.debug('File does not exist in remote repo: %s', relRepoPath)
+        elif remoteChecksums[relRepoPath] != sha1:
+            logging.error('Checksums do not match for artifact %s', relRepoPath)
 
 
 def main():
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+"""compare_resolvers.py: Compare dependencies resolved by PomResolver to the output of mvn dependency:list."""
+
+import logging
+import optparse
+import sys
+
+import maven_repo_util
+from artifact_list_builder import ArtifactListBuilder
+from configuration import Configuration
+from pom_resolver import PomResolver
+
+
+def compareResolvers(repoUrls, gavs, includeScope=None):
+    """
+    Resolves dependencies of every GAV by both Maven and PomResolver and logs the differences.
+
+    :param repoUrls: list of repository URLs
+    :param gavs: list of GAVs to resolve
+    :param includeScope: includeScope parameter of mvn dependency:list
+    :returns: number of GAVs with different results
+    """
+    builder = ArtifactListBuilder(Configuration())
+    resolver = PomResolver(repoUrls)
+    differing = 0
+    for gav in gavs:
+        mavenGavs = builder._runDependencyList(gav, repoUrls, includeScope)
+        resolved = resolver.resolve(gav, includeScope)
+        pythonGavs = builder._parseDepList(resolved) if resolved is not None else None
+        if mavenGavs is None or pythonGavs is None:
+            logging.warning("%s: Maven %s, PomResolver %s", gav, "failed" if mavenGavs is None else "succeeded",
+                            "failed" if pythonGavs is None else "succeeded")
+            differing += 1
+            continue
+        onlyMaven = set(mavenGavs) - set(pythonGavs)
+        onlyPython = set(pythonGavs) - set(mavenGavs)
+        if onlyMaven or onlyPython:
+            logging.warning("%s differs\n  only in Maven: %s\n  only in PomResolver: %s", gav,
+                            ", ".join(sorted(onlyMaven)), ", ".join(sorted(onlyPython)))
+            differing += 1
+        else:
+            logging.info("%s: %d dependencies match", gav, len(mavenGavs))
+    logging.info("%d of %d GAVs differ", differing, len(gavs))
+    return differing
+
+
+def main():
+    usage = "usage: %prog [options] GAV_LIST_FILE"
+    cliOptParser = optparse.OptionParser(
+        usage=usage, description='Compare dependencies resolved by PomResolver to the output of mvn dependency:list.'
+    )
+    cliOptParser.add_option(
+        '-l', '--loglevel',
+        default='info',
+        help='Set the level of log output.  Can be set to debug, info, warning, error, or critical'
+    )
+    cliOptParser.add_option(
+        '-L', '--logfile',
+        help='Set the file in which the log output should be written.'
+    )
+    cliOptParser.add_option(
+        '-u', '--url',
+        default='http://repo1.maven.org/maven2/',
+        help='Comma-separated list of URLs of the repositories, defaults to Maven central'
+    )
+    cliOptParser.add_option(
+        '-s', '--scope',
+        help='Scope to use as includeScope parameter of mvn dependency:list'
+    )
+
+    (options, args) = cliOptParser.parse_args()
+
+    if (len(args) < 1):
+        logging.error('File with the list of GAVs must be specified\n')
+        cliOptParser.print_help()
+        sys.exit(1)
+
+    maven_repo_util.setLogLevel(options.loglevel, options.logfile)
+
+    gavs = maven_repo_util.loadFlatFile(args[0])
+    if compareResolvers(options.url.split(","), gavs, options.scope):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
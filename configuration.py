@@ -4,6 +4,7 @@ import os
 import sys
 
 import maven_repo_util
+from repository_crawler import ListingCache
 
 
 class Configuration:
@@ -24,6 +25,14 @@ class Configuration:
     addClassifiers = set()
     gatcvWhitelist = []
     useCache = True
+    listingCacheTtl = None
+    repositoryIndexTtl = None
+    negativeCacheTtl = None
+    useNegativeCache = True
+    filterTrace = None
+    filterTraceReasons = False
+    mavenLocalRepository = None
+    mavenOffline = None
     analyze = False
 
     def load(self, opts):
@@ -43,6 +52,11 @@ class Configuration:
             self.gatcvWhitelist = maven_repo_util.loadArtifactFile(opts.whitelist)
         if hasattr(opts, "cache"):
             self.useCache = opts.cache
+        if hasattr(opts, "negativeCache"):
+            self.useNegativeCache = opts.negativeCache
+        if hasattr(opts, "filterTrace"):
+            self.filterTrace = opts.filterTrace
+            self.filterTraceReasons = opts.filterTraceReasons
         self.analyze = (not opts.reportdir == None)
 
         self.loadFromFile(opts.config)
@@ -73,6 +87,11 @@ class Configuration:
             self.gatcvWhitelist = maven_repo_util.loadArtifactFile(opts.whitelist)
         if hasattr(opts, "cache"):
             self.useCache = opts.cache
+        if hasattr(opts, "negativeCache"):
+            self.useNegativeCache = opts.negativeCache
+        if hasattr(opts, "filterTrace"):
+            self.filterTrace = opts.filterTrace
+            self.filterTraceReasons = opts.filterTraceReasons
 
     def loadFromFile(self, filename):
         self._loadFromFile(filename)
@@ -88,6 +107,14 @@ class Configuration:
     def _setDefaults(self):
         if self.singleVersion is None:
             self.singleVersion = True
+        if self.listingCacheTtl is None:
+            self.listingCacheTtl = ListingCache.DEFAULT_TTL
+        if self.repositoryIndexTtl is None:
+            self.repositoryIndexTtl = maven_repo_util.REPOSITORY_INDEX_TTL
+        if self.negativeCacheTtl is None:
+            self.negativeCacheTtl = maven_repo_util.NEGATIVE_CACHE_TTL
+        if self.mavenOffline is None:
+            self.mavenOffline = False
         for source in self.artifactSources:
             if source['type'] == 'dependency-list':
                 if 'recursive' not in source:
@@ -96,6 +123,10 @@ class Configuration:
                     source['include-scope'] = None
                 if 'skip-missing' not in source:
                     source['skip-missing'] = True
+                if 'maven-processes' not in source:
+                    source['maven-processes'] = 1
+                if 'resolver' not in source:
+                    source['resolver'] = 'maven'
             elif source['type'] == 'dependency-graph':
                 if 'wsid' not in source:
                     source['wsid'] = None
@@ -114,6 +145,8 @@ class Configuration:
             elif source['type'] == 'repository':
                 if 'included-gav-patterns' not in source:
                     source['included-gav-patterns'] = []
+                if 'prune-versions' not in source:
+                    source['prune-versions'] = False
 
     def _validate(self):
         valid = True
@@ -140,6 +173,11 @@ class Configuration:
                     if not len(source['top-level-gavs']):
                         logging.error("No top-level GAV specified for source with type dependency-graph.")
                         valid = False
+                elif source['type'] == 'dependency-list':
+                    if source['resolver'] not in ('maven', 'python'):
+                        logging.error("Unknown resolver '%s' specified for source with type dependency-list, "
+                                      "supported are maven and python.", source['resolver'])
+                        valid = False
         if not valid:
             sys.exit(1)
 
@@ -163,6 +201,21 @@ class Configuration:
         if (rewrite or self.singleVersion is None) and 'single-version' in data:
             self.singleVersion = maven_repo_util.str2bool(data['single-version'])
 
+        if (rewrite or self.listingCacheTtl is None) and 'listing-cache-ttl' in data:
+            self.listingCacheTtl = int(data['listing-cache-ttl'])
+
+        if (rewrite or self.repositoryIndexTtl is None) and 'repository-index-ttl' in data:
+            self.repositoryIndexTtl = int(data['repository-index-ttl'])
+
+        if (rewrite or self.negativeCacheTtl is None) and 'negative-cache-ttl' in data:
+            self.negativeCacheTtl = int(data['negative-cache-ttl'])
+
+        if (rewrite or self.mavenLocalRepository is None) and 'maven-local-repository' in data:
+            self.mavenLocalRepository = self._getRelativeFilename(data['maven-local-repository'], filePath)
+
+        if (rewrite or self.mavenOffline is None) and 'maven-offline' in data:
+            self.mavenOffline = maven_repo_util.str2bool(data['maven-offline'])
+
         if 'artifact-sources' in data:
             self._loadArtifactSources(data['artifact-sources'], filePath)
 
@@ -201,6 +254,8 @@ class Configuration:
                     source['recursive'] = maven_repo_util.str2bool(source['recursive'])
                 if 'skip-missing' in source:
                     source['skip-missing'] = maven_repo_util.str2bool(source['skip-missing'])
+                if 'maven-processes' in source:
+                    source['maven-processes'] = int(source['maven-processes'])
                 source['repo-url'] = self._getRepoUrl(source)
                 source['top-level-gavs'] = self._loadFlatFileBySourceParameter(source, 'top-level-gavs-ref',
                                                                                filePath)
@@ -218,6 +273,8 @@ class Configuration:
                 source['excluded-subgraphs'] = excluded_subgraphs
 
             elif source['type'] == 'repository':
+                if 'prune-versions' in source:
+                    source['prune-versions'] = maven_repo_util.str2bool(source['prune-versions'])
                 source['repo-url'] = self._getRepoUrl(source)
                 source['included-gav-patterns'] = self._loadFlatFileBySourceParameter(source,
                                                                                       'included-gav-patterns-ref',
@@ -1,5 +1,8 @@
-import copy
+import json
 import logging
+import multiprocessing
+import time
+import zlib
 from multiprocessing.pool import ThreadPool
 
 import maven_repo_util
@@ -8,32 +11,183 @@ from maven_artifact import MavenArtifact
 
 class Filter:
 
+    # filtering stages in the order of their application, the names are keys of dropCounts
+    STAGES = ("excludedGAVs", "excludedTypes", "duplicates", "multipleVersions", "excludedRepositories")
+
+    # maximum number of processes filtering the artifactList
+    MAX_PROCESSES = multiprocessing.cpu_count()
+
+    # minimal number of GAs per process, smaller lists are filtered in the current process
+    MIN_GAS_PER_PROCESS = 5000
+
+    # number of GA shards per process, more shards balance the load better
+    SHARDS_PER_PROCESS = 4
+
     def __init__(self, config):
         self.config = config
+        self.dropCounts = dict((stage, 0) for stage in self.STAGES)
+        self._setUpTracing()
+
+    def _setUpTracing(self):
+        """
+        Creates an empty FilterTrace if a trace file is configured and selects the function explaining dropped items.
+        The explaining function is None when the reasons are neither traced nor logged, so that the filtering stages
+        do not format the dropped items at all.
+        """
+        if self.config.filterTrace:
+            self.trace = FilterTrace(self.config.filterTraceReasons)
+        else:
+            self.trace = None
+        if (self.trace and self.trace.dropped is not None) or _isDebugLogged():
+            self.explain = self._explainDrop
+        else:
+            self.explain = None
+
+    def _explainDrop(self, stage, item, priority, reason):
+        """
+        Logs a dropped item and records it in the trace if the reasons are traced.
+
+        :param stage: name of the stage dropping the item
+        :param item: description of the dropped item, e.g. "GAV g:a:v"
+        :param priority: priority of the dropped item
+        :param reason: reason of the drop following the word "because"
+        """
+        logging.debug("Dropping %s from priority %i because %s.", item, priority, reason)
+        if self.trace and self.trace.dropped is not None:
+            self.trace.addDrop(stage, item, priority, reason)
 
     def filter(self, artifactList):
         """
         Filter artifactList removing excluded GAVs, duplicates and GAVs that exists in
-        excluded repositories.
+        excluded repositories. All stages except the lookup in excluded repositories are applied GA by GA in a single
+        pass over the artifactList. Numbers of GAVs dropped by each stage are stored in dropCounts.
 
         :param artifactList: artifactList from ArtifactListBuilder.
         :returns: filtered artifactList.
         """
+        self.dropCounts = dict((stage, 0) for stage in self.STAGES)
+        self._setUpTracing()
+        start = time.time()
+        processes = min(self.MAX_PROCESSES, len(artifactList) / self.MIN_GAS_PER_PROCESS)
+        if processes > 1:
+            self._filterGAsInProcesses(artifactList, processes)
+        else:
+            self._filterGAs(artifactList)
 
-        if self.config.excludedGAVs:
-            artifactList = self._filterExcludedGAVs(artifactList)
+        if self.config.excludedRepositories:
+            if self.trace:
+                countsIn = _countArtifacts(artifactList.itervalues())
+                stageStart = time.time()
+            artifactList = self._filterExcludedRepositories(artifactList)
+            if self.trace:
+                self.trace.addStage("excludedRepositories", time.time() - stageStart, countsIn,
+                                    _countArtifacts(artifactList.itervalues()))
+
+        logging.info("Dropped GAVs by filtering stages: %s", ", ".join("%s %d" % (stage, self.dropCounts[stage])
+                                                                       for stage in self.STAGES))
+        if self.trace:
+            self.trace.write(self.config.filterTrace, time.time() - start, max(processes, 1), self.dropCounts)
+            logging.info("Filter trace written to %s", self.config.filterTrace)
+        return artifactList
 
-        if self.config.excludedTypes:
-            artifactList = self._filterExcludedTypes(artifactList)
+    def _filterGAs(self, artifactList):
+        """
+        Applies all filtering stages except the lookup in excluded repositories GA by GA.
 
-        artifactList = self._filterDuplicates(artifactList)
+        :param artifactList: artifactList to be filtered in place
+        """
+        stages = self._getGAStages()
+        trace = self.trace
+        for ga in sorted(artifactList.keys()):
+            gaArtifacts = artifactList[ga]
+            for (stage, function, args) in stages:
+                if trace:
+                    countsIn = _countArtifacts([gaArtifacts])
+                    start = time.time()
+                self.dropCounts[stage] += function(ga, gaArtifacts, *args)
+                if trace:
+                    trace.addStage(stage, time.time() - start, countsIn, _countArtifacts([gaArtifacts]))
+                if not gaArtifacts:
+                    logging.debug("Dropping GA %s because of no priority left.", ga)
+                    del artifactList[ga]
+                    break
+
+    def _filterGAsInProcesses(self, artifactList, processes):
+        """
+        Applies the same stages as _filterGAs, but shards artifactList by GA hash and filters the shards in a pool
+        of processes. The filtered shards are merged back in the shard order.
+
+        :param artifactList: artifactList to be filtered in place
+        :param processes: number of processes
+        """
+        global _shards
+        shardCount = processes * self.SHARDS_PER_PROCESS
+        shards = [{} for _ in range(shardCount)]
+        for (ga, gaArtifacts) in artifactList.iteritems():
+            shards[zlib.crc32(ga) % shardCount][ga] = gaArtifacts
+        logging.debug("Filtering %d GAs in %d shards by %d processes.", len(artifactList), shardCount, processes)
+
+        # the forked workers inherit the shards, only their indexes and the kept artifacts are pickled
+        _shards = shards
+        try:
+            pool = multiprocessing.Pool(processes)
+            try:
+                results = [pool.apply_async(_filterShard, [self.config, index]) for index in range(shardCount)]
+                filteredShards = [result.get() for result in results]
+                pool.close()
+            except BaseException:
+                pool.terminate()
+                raise
+            finally:
+                pool.join()
+        finally:
+            _shards = None
+
+        artifactList.clear()
+        for (shard, (keptArtifacts, dropCounts, trace)) in zip(shards, filteredShards):
+            for (ga, gaKept) in keptArtifacts.iteritems():
+                artifactList[ga] = _restoreKeptArtifacts(shard[ga], gaKept)
+            for stage in dropCounts:
+                self.dropCounts[stage] += dropCounts[stage]
+            if self.trace:
+                self.trace.merge(trace)
+
+    def _getGAStages(self):
+        """
+        Creates list of filtering stages applied to each GA according to the configuration.
 
+        :returns: list of tuples (stage name, function filtering artifacts of a GA, additional arguments)
+        """
+        stages = []
+        if self.config.excludedGAVs:
+            stages.append(("excludedGAVs", self._filterExcludedGAVsOfGA,
+                           maven_repo_util.getGAVAndGATCVMatchers(self.config.excludedGAVs)))
+        if self.config.excludedTypes:
+            stages.append(("excludedTypes", self._filterExcludedTypesOfGA,
+                           (maven_repo_util.getPatternMatcher(self.config.gatcvWhitelist),
+                            set(self.config.excludedTypes))))
+        stages.append(("duplicates", self._filterDuplicatesOfGA, ()))
         if self.config.singleVersion:
-            artifactList = self._filterMultipleVersions(artifactList)
+            stages.append(("multipleVersions", self._filterMultipleVersionsOfGA,
+                           (maven_repo_util.getPatternMatcher(self.config.multiVersionGAs, False),)))
+        return stages
 
-        if self.config.excludedRepositories:
-            artifactList = self._filterExcludedRepositories(artifactList)
+    def _applyStage(self, artifactList, stage, function, args):
+        """
+        Applies a single filtering stage to all GAs of artifactList.
 
+        :param artifactList: artifactList to be filtered.
+        :param stage: stage name
+        :param function: function filtering artifacts of a GA
+        :param args: additional arguments of the function
+        :returns: filtered artifactList
+        """
+        self.dropCounts[stage] = 0
+        for ga in artifactList.keys():
+            self.dropCounts[stage] += function(ga, artifactList[ga], *args)
+            if not artifactList[ga]:
+                logging.debug("Dropping GA %s because of no priority left.", ga)
+                del artifactList[ga]
         return artifactList
 
     def _filterExcludedGAVs(self, artifactList):
@@ -45,50 +199,58 @@ class Filter:
         """
 
         logging.debug("Filtering artifacts with excluded GAVs.")
-        regExps = maven_repo_util.getRegExpsFromStrings(self.config.excludedGAVs)
-        gavRegExps = []
-        gatcvRegExps = []
-        for regExp in regExps:
-            if regExp.pattern.count(":") > 2:
-                gatcvRegExps.append(regExp)
-            else:
-                gavRegExps.append(regExp)
-        for ga in artifactList.keys():
-            for priority in artifactList[ga].keys():
-                for version in artifactList[ga][priority].keys():
-                    gav = "%s:%s" % (ga, version)
-                    if maven_repo_util.somethingMatch(gavRegExps, gav):
-                        logging.debug("Dropping GAV %s:%s from priority %i because it matches an excluded "
-                                      "GAV pattern.", ga, version, priority)
-                        del artifactList[ga][priority][version]
-                    else:
-                        artSpec = artifactList[ga][priority][version]
-                        for artType in copy.deepcopy(artSpec.artTypes.keys()):
-                            at = artSpec.artTypes[artType]
-                            for classifier in copy.deepcopy(at.classifiers):
+        return self._applyStage(artifactList, "excludedGAVs", self._filterExcludedGAVsOfGA,
+                                maven_repo_util.getGAVAndGATCVMatchers(self.config.excludedGAVs))
+
+    def _filterExcludedGAVsOfGA(self, ga, gaArtifacts, gavMatcher, gatcvMatcher):
+        """
+        Removes GAVs and GATCVs matching excluded GAV patterns from artifacts of a GA.
+
+        :param ga: the GA
+        :param gaArtifacts: dictionary priority -> version -> ArtifactSpec of the GA
+        :param gavMatcher: PatternMatcher of excluded GAVs
+        :param gatcvMatcher: PatternMatcher of excluded GATCVs
+        :returns: number of dropped GAVs
+        """
+        dropped = 0
+        explain = self.explain
+        for priority in gaArtifacts.keys():
+            for version in gaArtifacts[priority].keys():
+                gav = "%s:%s" % (ga, version)
+                if gavMatcher.match(gav):
+                    if explain:
+                        explain("excludedGAVs", "GAV " + gav, priority, "it matches an excluded GAV pattern")
+                    del gaArtifacts[priority][version]
+                    dropped += 1
+                else:
+                    artSpec = gaArtifacts[priority][version]
+                    for artType in artSpec.artTypes.keys():
+                        at = artSpec.artTypes[artType]
+                        if gatcvMatcher:
+                            for classifier in list(at.classifiers):
                                 if classifier:
                                     gatcv = "%s:%s:%s:%s" % (ga, artType, classifier, version)
                                 else:
                                     gatcv = "%s:%s:%s" % (ga, artType, version)
-                                if maven_repo_util.somethingMatch(gatcvRegExps, gatcv):
-                                    logging.debug("Dropping GATCV %s from priority %i because it matches an excluded "
-                                                  "GAV pattern.", gatcv, priority)
+                                if gatcvMatcher.match(gatcv):
+                                    if explain:
+                                        explain("excludedGAVs", "GATCV " + gatcv, priority,
+                                                "it matches an excluded GAV pattern")
                                     at.classifiers.remove(classifier)
-                            if not at.classifiers:
-                                logging.debug("Dropping GATV %s:%s:%s from priority %i because of no classifiers left.",
-                                              ga, artType, version, priority)
-                                del artSpec.artTypes[artType]
-                        if not artSpec.containsMain():
-                            logging.debug("Dropping GAV %s:%s from priority %i because of no main artifact left.",
-                                          ga, version, priority)
-                            del artifactList[ga][priority][version]
-                if not artifactList[ga][priority]:
-                    logging.debug("Dropping GA %s from priority %i because of no version left.", ga, priority)
-                    del artifactList[ga][priority]
-            if not artifactList[ga]:
-                logging.debug("Dropping GA %s because of no priority left.", ga)
-                del artifactList[ga]
-        return artifactList
+                        if not at.classifiers:
+                            if explain:
+                                explain("excludedGAVs", "GATV %s:%s:%s" % (ga, artType, version), priority,
+                                        "of no classifiers left")
+                            del artSpec.artTypes[artType]
+                    if not artSpec.containsMain():
+                        if explain:
+                            explain("excludedGAVs", "GAV " + gav, priority, "of no main artifact left")
+                        del gaArtifacts[priority][version]
+                        dropped += 1
+            if not gaArtifacts[priority]:
+                logging.debug("Dropping GA %s from priority %i because of no version left.", ga, priority)
+                del gaArtifacts[priority]
+        return dropped
 
     def _filterExcludedTypes(self, artifactList):
         '''
@@ -100,52 +262,55 @@ class Filter:
         :returns: artifactList without artifacts that matched specified types and had no other main types.
         '''
         logging.debug("Filtering artifacts with excluded types.")
-        regExps = maven_repo_util.getRegExpsFromStrings(self.config.gatcvWhitelist)
-        exclTypes = self.config.excludedTypes
-        for ga in artifactList.keys():
-            for priority in artifactList[ga].keys():
-                for version in artifactList[ga][priority].keys():
-                    artSpec = artifactList[ga][priority][version]
-                    for artType in list(artSpec.artTypes.keys()):
-                        if artType in exclTypes:
-                            artTypeObj = artSpec.artTypes[artType]
-                            classifiers = artTypeObj.classifiers
-                            (groupId, artifactId) = ga.split(':')
-                            for classifier in list(classifiers):
-                                art = MavenArtifact(groupId, artifactId, artType, version, classifier)
-                                gatcv = art.getGATCV()
-                                if not maven_repo_util.somethingMatch(regExps, gatcv):
-                                    logging.debug("Dropping classifier \"%s\" of %s:%s:%s from priority %i because of "
-                                                  "excluded type.", classifier, ga, artType, version, priority)
-                                    classifiers.remove(classifier)
-                                else:
-                                    logging.debug("Skipping drop of %s:%s:%s:%s from priority %i because it matches a "
-                                                  "whitelist pattern.", ga, artType, classifier, version, priority)
-                            if not classifiers:
-                                logging.debug("Dropping %s:%s:%s from priority %i because of no classifier left.", ga,
-                                              artType, version, priority)
-                                del(artSpec.artTypes[artType])
-                    noMain = True
-                    for artType in artSpec.artTypes.keys():
-                        artTypeObj = artSpec.artTypes[artType]
-                        if artTypeObj.mainType:
-                            noMain = False
-                            break
-                    if not artSpec.artTypes or noMain:
-                        if noMain:
-                            logging.debug("Dropping GAV %s:%s from priority %i because of no main artifact left.",
-                                          ga, version, priority)
-                        else:
-                            logging.debug("Dropping GAV %s:%s from priority %i because of no artifact type left.",
-                                          ga, version, priority)
-                        del artifactList[ga][priority][version]
-                if not artifactList[ga][priority]:
-                    logging.debug("Dropping GA %s from priority %i because of no version left.", ga, priority)
-                    del artifactList[ga][priority]
-            if not artifactList[ga]:
-                logging.debug("Dropping GA %s because of no priority left.", ga)
-                del artifactList[ga]
-        return artifactList
+        return self._applyStage(artifactList, "excludedTypes", self._filterExcludedTypesOfGA,
+                                (maven_repo_util.getPatternMatcher(self.config.gatcvWhitelist),
+                                 set(self.config.excludedTypes)))
+
+    def _filterExcludedTypesOfGA(self, ga, gaArtifacts, whitelistMatcher, exclTypes):
+        """
+        Removes classifiers of excluded types not matching the whitelist from artifacts of a GA and GAVs without any
+        main type left.
+
+        :param ga: the GA
+        :param gaArtifacts: dictionary priority -> version -> ArtifactSpec of the GA
+        :param whitelistMatcher: PatternMatcher of whitelisted GATCVs
+        :param exclTypes: set of excluded types
+        :returns: number of dropped GAVs
+        """
+        dropped = 0
+        explain = self.explain
+        for priority in gaArtifacts.keys():
+            for version in gaArtifacts[priority].keys():
+                artSpec = gaArtifacts[priority][version]
+                for artType in artSpec.artTypes.keys():
+                    if artType in exclTypes:
+                        classifiers = artSpec.artTypes[artType].classifiers
+                        for classifier in list(classifiers):
+                            # the same format as MavenArtifact.getGATCV()
+                            gatcv = ":".join([part for part in (ga, artType, classifier, version) if part])
+                            if not whitelistMatcher.match(gatcv):
+                                if explain:
+                                    explain("excludedTypes", "GATCV " + gatcv, priority, "of excluded type")
+                                classifiers.remove(classifier)
+                            else:
+                                logging.debug("Skipping drop of %s:%s:%s:%s from priority %i because it matches a "
+                                              "whitelist pattern.", ga, artType, classifier, version, priority)
+                        if not classifiers:
+                            if explain:
+                                explain("excludedTypes", "GATV %s:%s:%s" % (ga, artType, version), priority,
+                                        "of no classifier left")
+                            del(artSpec.artTypes[artType])
+                noMain = not artSpec.containsMain()
+                if not artSpec.artTypes or noMain:
+                    if explain:
+                        explain("excludedTypes", "GAV %s:%s" % (ga, version), priority,
+                                "of no main artifact left" if noMain else "of no artifact type left")
+                    del gaArtifacts[priority][version]
+                    dropped += 1
+            if not gaArtifacts[priority]:
+                logging.debug("Dropping GA %s from priority %i because of no version left.", ga, priority)
+                del gaArtifacts[priority]
+        return dropped
 
     def _filterExcludedRepositories(self, artifactList):
         """
@@ -174,10 +339,12 @@ class Filter:
         # Close the pool and wait for the workers to finnish
         pool.close()
         pool.join()
+        self.dropCounts["excludedRepositories"] = len(delArtifacts)
         for artifact, priority in delArtifacts:
             ga = artifact.getGA()
-            logging.debug("Dropping GAV %s:%s from priority %i because it was found in an excluded repository.",
-                          ga, artifact.version, priority)
+            if self.explain:
+                self.explain("excludedRepositories", "GAV %s:%s" % (ga, artifact.version), priority,
+                             "it was found in an excluded repository")
             del artifactList[ga][priority][artifact.version]
             if not artifactList[ga][priority]:
                 logging.debug("Dropping GA %s from priority %i because of no version left.", ga, priority)
@@ -197,56 +364,234 @@ class Filter:
         """
 
         logging.debug("Filtering duplicate artifacts.")
-        for ga in artifactList.keys():
-            for priority in sorted(artifactList[ga].keys()):
-                for version in artifactList[ga][priority].keys():
-                    for pr in artifactList[ga].keys():
-                        if pr <= priority:
-                            continue
-                        if version in artifactList[ga][pr]:
-                            logging.debug("Dropping GAV %s:%s from priority %i because its duplicate was found in "
-                                          "priority %s.", ga, version, pr, priority)
-                            if len(artifactList[ga][pr][version].paths):
-                                artifactList[ga][priority][version].paths.extend(artifactList[ga][pr][version].paths)
-                            del artifactList[ga][pr][version]
-                if not artifactList[ga][priority]:
-                    logging.debug("Dropping GA %s from priority %i because of no version left.", ga, priority)
-                    del artifactList[ga][priority]
-            if not artifactList[ga]:
-                logging.debug("Dropping GA %s because of no priority left.", ga)
-                del artifactList[ga]
-        return artifactList
+        return self._applyStage(artifactList, "duplicates", self._filterDuplicatesOfGA, ())
+
+    def _filterDuplicatesOfGA(self, ga, gaArtifacts):
+        """
+        Removes versions of a GA present also in a higher priority. Priorities are swept once from the highest one,
+        the first occurrence of every version wins and paths of its duplicates are merged into it.
+
+        :param ga: the GA
+        :param gaArtifacts: dictionary priority -> version -> ArtifactSpec of the GA
+        :returns: number of dropped GAVs
+        """
+        dropped = 0
+        explain = self.explain
+        winners = {}  # version -> (priority, ArtifactSpec)
+        for priority in sorted(gaArtifacts.keys()):
+            versions = gaArtifacts[priority]
+            for version in versions.keys():
+                if version in winners:
+                    (winnerPriority, winnerSpec) = winners[version]
+                    if explain:
+                        explain("duplicates", "GAV %s:%s" % (ga, version), priority,
+                                "its duplicate was found in priority %s" % winnerPriority)
+                    winnerSpec.paths.extend(versions[version].paths)
+                    del versions[version]
+                    dropped += 1
+                else:
+                    winners[version] = (priority, versions[version])
+            if not versions:
+                logging.debug("Dropping GA %s from priority %i because of no version left.", ga, priority)
+                del gaArtifacts[priority]
+        return dropped
 
     def _filterMultipleVersions(self, artifactList):
         logging.debug("Filtering multi-version artifacts to have just a single version.")
-        regExps = maven_repo_util.getRegExpsFromStrings(self.config.multiVersionGAs, False)
+        return self._applyStage(artifactList, "multipleVersions", self._filterMultipleVersionsOfGA,
+                                (maven_repo_util.getPatternMatcher(self.config.multiVersionGAs, False),))
 
-        for ga in sorted(artifactList.keys()):
-            if maven_repo_util.somethingMatch(regExps, ga):
-                continue
-
-            # Gather all priorities
-            priorities = sorted(artifactList[ga].keys())
-            priority = priorities[0]
-            # Gather all versions
-            versions = list(artifactList[ga][priority].keys())
-
-            if len(versions) > 1:  # list of 1 is sorted by definition
-                versions = maven_repo_util._sortVersionsWithAtlas(versions)
-
-            # Remove version, priorities and gats from artifactList as necessary
-            for version in versions[1:]:
-                logging.debug("Dropping GAV %s:%s from priority %i because only single version is allowed.", ga,
-                              version, priority)
-                del artifactList[ga][priority][version]
-            for p in priorities[1:]:
-                logging.debug("Dropping GA %s from priority %i because of no version left.", ga, p)
-                del artifactList[ga][p]
-            if not artifactList[ga]:
-                logging.debug("Dropping GA %s because of no priority left.", ga)
-                del artifactList[ga]
+    def _filterMultipleVersionsOfGA(self, ga, gaArtifacts, multiVersionMatcher):
+        """
+        Keeps only the newest version of the highest priority of a GA unless the GA matches a multi-version pattern.
 
-        return artifactList
+        :param ga: the GA
+        :param gaArtifacts: dictionary priority -> version -> ArtifactSpec of the GA
+        :param multiVersionMatcher: PatternMatcher of GAs allowed to have multiple versions
+        :returns: number of dropped GAVs
+        """
+        if multiVersionMatcher.match(ga):
+            return 0
+
+        dropped = 0
+        # Gather all priorities
+        priorities = sorted(gaArtifacts.keys())
+        priority = priorities[0]
+        # Gather all versions
+        versions = list(gaArtifacts[priority].keys())
+
+        if len(versions) > 1:  # list of 1 is sorted by definition
+            versions = maven_repo_util._sortVersionsWithAtlas(versions)
+
+        # Remove version, priorities and gats from artifactList as necessary
+        explain = self.explain
+        for version in versions[1:]:
+            if explain:
+                explain("multipleVersions", "GAV %s:%s" % (ga, version), priority,
+                        "only single version is allowed")
+            del gaArtifacts[priority][version]
+            dropped += 1
+        for p in priorities[1:]:
+            if explain:
+                for version in gaArtifacts[p]:
+                    explain("multipleVersions", "GAV %s:%s" % (ga, version), p,
+                            "only single version of priority %s is allowed" % priority)
+            logging.debug("Dropping GA %s from priority %i because of no version left.", ga, p)
+            dropped += len(gaArtifacts[p])
+            del gaArtifacts[p]
+        return dropped
+
+
+# shards of artifactList filtered by the process pool, set only while the pool is running
+_shards = None
+
+
+def _filterShard(config, index):
+    """
+    Filters a shard of artifactList in a worker process.
+
+    :param config: configuration
+    :param index: index of the shard in _shards
+    :returns: tuple (kept artifacts of the shard, dictionary of dropped GAV counts by stage, FilterTrace or None),
+              the kept artifacts are in format GA -> priority -> version -> (tuple of (type, tuple of classifiers),
+              list of paths)
+    """
+    shard = _shards[index]
+    listFilter = Filter(config)
+    listFilter._filterGAs(shard)
+    keptArtifacts = {}
+    for (ga, gaArtifacts) in shard.iteritems():
+        keptArtifacts[ga] = dict(
+            (priority, dict((version, (tuple((artType, tuple(at.classifiers)) for (artType, at) in
+                                             artSpec.artTypes.iteritems()), artSpec.paths))
+                            for (version, artSpec) in versions.iteritems()))
+            for (priority, versions) in gaArtifacts.iteritems())
+    return (keptArtifacts, listFilter.dropCounts, listFilter.trace)
+
+
+def _countArtifacts(gaArtifactsList):
+    """
+    Counts GAVs and GATCVs in artifacts of GAs.
+
+    :param gaArtifactsList: iterable of dictionaries priority -> version -> ArtifactSpec
+    :returns: tuple (number of GAVs, number of GATCVs)
+    """
+    gavs = 0
+    gatcvs = 0
+    for gaArtifacts in gaArtifactsList:
+        for versions in gaArtifacts.itervalues():
+            gavs += len(versions)
+            for artSpec in versions.itervalues():
+                for at in artSpec.artTypes.itervalues():
+                    gatcvs += len(at.classifiers)
+    return (gavs, gatcvs)
+
+
+def _restoreKeptArtifacts(gaArtifacts, gaKept):
+    """
+    Applies the result of filtering in a worker process to the unfiltered artifacts of a GA.
+
+    :param gaArtifacts: unfiltered dictionary priority -> version -> ArtifactSpec of the GA
+    :param gaKept: kept artifacts of the GA as returned by _filterShard()
+    :returns: filtered dictionary priority -> version -> ArtifactSpec of the GA
+    """
+    filtered = {}
+    for (priority, versions) in gaKept.iteritems():
+        filtered[priority] = {}
+        for (version, (artTypes, paths)) in versions.iteritems():
+            artSpec = gaArtifacts[priority][version]
+            artSpec.artTypes = dict((artType, artSpec.artTypes[artType]) for (artType, _) in artTypes)
+            for (artType, classifiers) in artTypes:
+                artSpec.artTypes[artType].classifiers = set(classifiers)
+            artSpec.paths = paths
+            filtered[priority][version] = artSpec
+    return filtered
+
+
+class FilterTrace:
+    """
+    Structured trace of filtering written as JSON. For every applied stage it holds the wall time and numbers of GAVs
+    and GATCVs entering and leaving the stage, optionally also every dropped item with the reason of its removal.
+    """
+
+    def __init__(self, reasons=False):
+        """
+        :param reasons: if True, dropped items are recorded with their reasons
+        """
+        self.stages = {}
+        self.dropped = [] if reasons else None
+
+    def addStage(self, stage, duration, countsIn, countsOut):
+        """
+        Adds a stage application to the trace, applications of the same stage on different GAs are summed.
+
+        :param stage: stage name
+        :param duration: wall time of the application in seconds
+        :param countsIn: tuple (number of GAVs, number of GATCVs) before the application
+        :param countsOut: tuple (number of GAVs, number of GATCVs) after the application
+        """
+        stageTrace = self.stages.setdefault(stage, [0.0, 0, 0, 0, 0])
+        stageTrace[0] += duration
+        stageTrace[1] += countsIn[0]
+        stageTrace[2] += countsOut[0]
+        stageTrace[3] += countsIn[1]
+        stageTrace[4] += countsOut[1]
+
+    def addDrop(self, stage, item, priority, reason):
+        """
+        Records a dropped item.
+
+        :param stage: name of the stage dropping the item
+        :param item: description of the dropped item
+        :param priority: priority of the dropped item
+        :param reason: reason of the drop
+        """
+        self.dropped.append({"stage": stage, "item": item, "priority": priority, "reason": reason})
+
+    def merge(self, other):
+        """
+        Adds another trace, e.g. of a shard filtered in a worker process, to this one.
+
+        :param other: the other FilterTrace
+        """
+        for (stage, stageTrace) in other.stages.iteritems():
+            self.addStage(stage, stageTrace[0], (stageTrace[1], stageTrace[3]), (stageTrace[2], stageTrace[4]))
+        if self.dropped is not None and other.dropped is not None:
+            self.dropped.extend(other.dropped)
+
+    def write(self, filename, duration, processes, dropCounts):
+        """
+        Writes the trace to a JSON file.
+
+        :param filename: name of the written file
+        :param duration: wall time of the whole filtering in seconds
+        :param processes: number of processes which applied the stages except excluded repositories, the stage times
+                          are summed across them
+        :param dropCounts: numbers of dropped GAVs by stage
+        """
+        stages = []
+        for stage in Filter.STAGES:
+            if stage in self.stages:
+                (stageTime, gavsIn, gavsOut, gatcvsIn, gatcvsOut) = self.stages[stage]
+                stages.append({"stage": stage, "time": stageTime, "gavs-in": gavsIn, "gavs-out": gavsOut,
+                               "gatcvs-in": gatcvsIn, "gatcvs-out": gatcvsOut, "dropped-gavs": dropCounts[stage]})
+        data = {"time": duration, "processes": processes, "stages": stages}
+        if self.dropped is not None:
+            data["dropped"] = self.dropped
+        with open(filename, "w") as traceFile:
+            json.dump(data, traceFile, indent=2, sort_keys=True)
+
+
+def _isDebugLogged():
+    """
+    Checks if debug messages logged by the root logger are emitted by any of its handlers.
+
+    :returns: True if the root logger and at least one of its handlers are enabled for debug level, False otherwise
+    """
+    rootLogger = logging.getLogger()
+    if not rootLogger.isEnabledFor(logging.DEBUG):
+        return False
+    return any(handler.level <= logging.DEBUG for handler in rootLogger.handlers)
 
 
 def _artifactInRepos(repositories, artifact, priority, artifacts):
@@ -13,6 +13,11 @@ class MavenArtifact:
     """
     snapshotVersionSuffix = None
 
+    """
+    Attributes of the artifact file known from the artifact source, i.e. "size" and checksums keyed by their type.
+    """
+    fileInfo = None
+
     gav_cache = dict()
 
     def __init__(self, groupId, artifactId, artifactType, version, classifier=''):
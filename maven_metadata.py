@@ -4,7 +4,7 @@ import copy
 import os
 import re
 from optparse import OptionParser
-from xml.dom.minidom import parseString
+from xml.sax.saxutils import escape
 
 import maven_repo_util
 
@@ -25,12 +25,50 @@ def ffilter(parent, dname, art_id):
         return os.path.exists(os.path.join(parent, dname, art_id + "-" + dname + ".pom"))
 
 
-parser = OptionParser(usage='%prog [directories]')
-(opts, directories) = parser.parse_args()
+def _element(name, value, indent):
+    """Formats a single text-only element on its own line, an empty one is written as a self-closing tag."""
+    if not value:
+        return '%s<%s/>\n' % ("  " * indent, name)
+    return '%s<%s>%s</%s>\n' % ("  " * indent, name, escape(value, {'"': "&quot;"}), name)
+
+
+def writeMetadata(out, group_id, art_id, versions, latest, releaseVersion, last_updated):
+    """
+    Writes maven-metadata.xml content for the given GA into a file-like object. The output is written element by
+    element in the same layout as minidom's toprettyxml(indent='  ') with collapsed text nodes.
+
+    :param out: file-like object to write to
+    :param group_id: groupId of the artifact
+    :param art_id: artifactId of the artifact
+    :param versions: list of versions sorted from the oldest to the latest
+    :param latest: the latest version
+    :param releaseVersion: the latest release version or None if there is no release version
+    :param last_updated: timestamp string in format %Y%m%d%H%M%S
+    """
+    out.write('<?xml version="1.0" ?>\n')
+    out.write('<metadata>\n')
+    out.write(_element("groupId", group_id, 1))
+    out.write(_element("artifactId", art_id, 1))
+    out.write('  <versioning>\n')
+    out.write(_element("latest", latest, 2))
+    if releaseVersion:
+        out.write(_element("release", releaseVersion, 2))
+    else:
+        out.write('    <release/>\n')
+    if versions:
+        out.write('    <versions>\n')
+        for version in versions:
+            out.write(_element("version", version, 3))
+        out.write('    </versions>\n')
+    else:
+        out.write('    <versions/>\n')
+    out.write(_element("lastUpdated", last_updated, 2))
+    out.write('  </versioning>\n')
+    out.write('</metadata>\n')
 
-sorterdir = os.path.dirname(os.path.realpath(__file__)) + '/versionSorter/'
 
-for directory in directories:
+def generateMetadata(directory, sorterdir):
+    """Generates maven-metadata.xml with its checksums in the given GA directory."""
     n_dir = os.path.normpath(directory)
 
     if not os.path.isdir(directory):
@@ -51,33 +89,10 @@ for directory in directories:
             break
     last_updated = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
 
-    content = "<metadata>"
-    content += "<groupId>%s</groupId>" % group_id
-    content += "<artifactId>%s</artifactId>" % art_id
-    content += "<versioning>"
-    content += "<latest>%s</latest>" % latest
-    if releaseVersion:
-        content += "<release>%s</release>" % releaseVersion
-    else:
-        content += "<release/>"
-    content += "<versions>"
-    for version in versions:
-        content += "<version>%s</version>" % version
-    content += "</versions>"
-    content += "<lastUpdated>%s</lastUpdated>" % last_updated
-    content += "</versioning>"
-    content += "</metadata>"
-
-    ugly_xml = parseString(content).toprettyxml(indent='  ')
-
-    text_re = re.compile('>\n\s+([^<>\s].*?)\n\s+</', re.DOTALL)
-    pretty_xml = text_re.sub('>\g<1></', ugly_xml)
-
     md_file = "%s/maven-metadata.xml" % n_dir
 
-    f = open(md_file, "w")
-    f.write(pretty_xml)
-    f.close()
+    with open(md_file, "w") as f:
+        writeMetadata(f, group_id, art_id, versions, latest, releaseVersion, last_updated)
 
     for ext, sum_constr in (('.md5', hashlib.md5()), ('.sha1', hashlib.sha1())):
         sumfile = md_file + ext
@@ -86,3 +101,17 @@ for directory in directories:
         checksum = maven_repo_util.getChecksum(md_file, sum_constr)
         with open(sumfile, 'w') as sumobj:
             sumobj.write(checksum)
+
+
+def main():
+    parser = OptionParser(usage='%prog [directories]')
+    (opts, directories) = parser.parse_args()
+
+    sorterdir = os.path.dirname(os.path.realpath(__file__)) + '/versionSorter/'
+
+    for directory in directories:
+        generateMetadata(directory, sorterdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -92,6 +92,27 @@ def main():
         help='Name of a file containing GATCV patterns allowing usage of stars or regular expressions when enclosed '
              'in "r/pattern/". It can force inclusion of artifacts with excluded types.'
     )
+    cliOptParser.add_option(
+        '--nonegativecache',
+        dest="negativeCache",
+        default=True,
+        action='store_false',
+        help='Request again also the URLs which were found missing in the previous runs and refresh the cache of '
+             'missing URLs.'
+    )
+    cliOptParser.add_option(
+        '--filtertrace',
+        dest="filterTrace",
+        help='Name of a JSON file in which a trace of the artifact list filtering should be written. It contains wall '
+             'time and numbers of GAVs and GATCVs entering and leaving each filtering stage.'
+    )
+    cliOptParser.add_option(
+        '--filtertracereasons',
+        dest="filterTraceReasons",
+        default=False,
+        action='store_true',
+        help='Write also every dropped item with the reason of its removal in the filter trace.'
+    )
     cliOptParser.add_option(
         "-O", '--reportdir',
         dest="reportdir",
@@ -119,6 +140,8 @@ def main():
 
     logging.info('Generating missing checksums...')
     generateChecksums(options.output)
+    logging.info('Writing repository index...')
+    maven_repo_util.writeRepositoryIndex(options.output)
     logging.info('Repository created in directory: %s', options.output)
 
     #cleanup
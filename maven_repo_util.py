@@ -10,16 +10,55 @@ import urllib2
 import urlparse
 import re
 import sys
+import time
 from subprocess import Popen
 from subprocess import PIPE
+from threading import Lock
 from xml.etree.ElementTree import ElementTree
+from xml.etree.ElementTree import ParseError
+
+from pattern_matcher import PatternMatcher
+from pattern_matcher import toRegExpString
 
 
 # Constants
 MAX_THREADS = 10
 
+REPOSITORY_INDEX_FILENAME = "repository-index.txt"
+REPOSITORY_INDEX_TTL = 7 * 86400
+
+# types of checksum files recorded next to the indexed files
+_INDEXED_CHECKSUM_TYPES = ("md5", "sha1")
+
 _regexGATCVS = None
 
+_regexNotIndexed = re.compile(r'(\.sha1$)|(\.md5$)|(^maven-metadata\.xml)|(\.lastUpdated$)|(^_maven\.repositories$)')
+
+# directory in which metadata and indexes of remote repositories are kept between runs
+REPOSITORY_CACHE_PATH = "cache/repositories"
+REPOSITORY_CACHE_TTL = 3600
+
+_repositoryIndexes = {}
+_repositoryIndexesLock = Lock()
+
+_listedUrls = set()
+_listedUrlsLock = Lock()
+
+_repositoryMetadata = {}
+_repositoryMetadataLocks = {}
+_repositoryMetadataLock = Lock()
+
+NEGATIVE_CACHE_PATH = "cache/negative-cache.txt"
+NEGATIVE_CACHE_TTL = 86400
+_MISSING_STATUSES = (404, 410)
+
+_negativeCache = None
+_negativeCacheSettings = {"path": NEGATIVE_CACHE_PATH, "ttl": 0, "lookup": False}
+_negativeCacheLock = Lock()
+
+_patternMatchers = {}
+_patternMatchersLock = Lock()
+
 
 class ChecksumMode:
     generate = 'generate'
@@ -39,9 +78,12 @@ def _downloadChecksum(url, filePath, checksumType, expectedSize, retries=3):
     :param retries: number of retries when a strange error occurs or filesize doesn't match the expected one'
     """
     csDownloaded = False
+    csUrl = url + "." + checksumType.lower()
+    if getCachedMissingStatus(csUrl):
+        logging.debug('Skipping %s checksum download, %s is known to be missing', checksumType.upper(), csUrl)
+        return csDownloaded
     while retries > 0 and not csDownloaded:
         retries -= 1
-        csUrl = url + "." + checksumType.lower()
         logging.debug('Downloading %s checksum from %s', checksumType.upper(), csUrl)
         try:
             csHttpResponse = urllib2.urlopen(urllib2.Request(csUrl))
@@ -58,8 +100,10 @@ def _downloadChecksum(url, filePath, checksumType, expectedSize, retries=3):
                 os.remove(csFilePath)
             else:
                 csDownloaded = True
+                recordUrlStatus(csUrl, csHttpResponse.code)
         except urllib2.HTTPError as err:
                 logging.warning('Unable to download checksum from %s, error code: %s', csUrl, err.code)
+                recordUrlStatus(csUrl, err.code)
                 if err.code / 100 != 5:  # if other than 5xx error occurs do not try again
                     retries = 0
         except urllib2.URLError as err:
@@ -67,8 +111,60 @@ def _downloadChecksum(url, filePath, checksumType, expectedSize, retries=3):
     return csDownloaded
 
 
-def download(url, filePath=None, checksumMode=ChecksumMode.check):
-    """Download the given url to a local file"""
+def _copyWithDigests(source, localfile, checksumTypes):
+    """
+    Copies the source file object to the local file and computes checksums of the copied content on the way.
+
+    :param source: file object to read
+    :param localfile: file object to write
+    :param checksumTypes: checksum types to compute, e.g. md5 or sha1
+    :returns: tuple (size, dictionary {checksumType: hexdigest})
+    """
+    digests = dict((checksumType, hashlib.new(checksumType)) for checksumType in checksumTypes)
+    size = 0
+    while True:
+        content = source.read(65536)
+        if not content:
+            break
+        size += len(content)
+        for digest in digests.itervalues():
+            digest.update(content)
+        localfile.write(content)
+    return (size, dict((checksumType, digest.hexdigest()) for (checksumType, digest) in digests.iteritems()))
+
+
+def _checkFileInfo(url, filePath, fileInfo, size, checksums):
+    """
+    Checks downloaded file against its size and checksums provided by the artifact source and writes the md5 and
+    sha1 checksum files of the verified content.
+
+    :param checksums: dictionary {checksumType: hexdigest} of the downloaded content
+    :returns: True if the file matches, False otherwise
+    """
+    if fileInfo.get("size") is not None and fileInfo["size"] != size:
+        logging.warning('Size of %s is %d, expected %d', url, size, fileInfo["size"])
+        return False
+    for (checksumType, checksum) in checksums.iteritems():
+        if fileInfo.get(checksumType) and checksum != fileInfo[checksumType].lower():
+            logging.warning('%s checksum of %s is %s, expected %s', checksumType.upper(), url, checksum,
+                            fileInfo[checksumType])
+            return False
+    for checksumType in ("md5", "sha1"):
+        if checksumType in checksums:
+            with open(filePath + "." + checksumType, "w") as checksumFile:
+                checksumFile.write(checksums[checksumType])
+    return True
+
+
+def download(url, filePath=None, checksumMode=ChecksumMode.check, fileInfo=None):
+    """
+    Download the given url to a local file. When fileInfo provides size or checksums of the file, the downloaded
+    content is verified against them instead of downloaded checksum files. When it provides a checksum, md5 and sha1
+    checksum files computed while downloading are written next to the file.
+
+    :param fileInfo: dictionary with "size", checksums keyed by type (md5, sha1 or sha256) and "checksumFiles" (set
+                     of checksum types whose files exist) of the file known from the artifact source, can be None
+    """
     logging.debug('Attempting download: %s', url)
 
     if filePath:
@@ -101,24 +197,40 @@ def download(url, filePath=None, checksumMode=ChecksumMode.check):
                 httpResponse = urllib2.urlopen(urllib2.Request(url))
                 if (httpResponse.code == 200):
                     filePath = filePath or getFileName(url, httpResponse)
+                    knownChecksumTypes = [checksumType for checksumType in ("md5", "sha1", "sha256")
+                                          if fileInfo and fileInfo.get(checksumType)]
+                    # checksum files missing in the artifact source are computed along with the provided ones
+                    digestTypes = set(knownChecksumTypes + ["md5", "sha1"]) if knownChecksumTypes else []
                     with open(filePath, 'wb') as localfile:
-                        shutil.copyfileobj(httpResponse, localfile)
+                        (size, checksums) = _copyWithDigests(httpResponse, localfile, digestTypes)
                     httpResponse.close()
 
-                    if checksumMode in (ChecksumMode.download, ChecksumMode.check):
-                        md5Downloaded = _downloadChecksum(url, filePath, "md5", 32)
-                        sha1Downloaded = _downloadChecksum(url, filePath, "sha1", 40)
-                        if not md5Downloaded or not sha1Downloaded:
-                            logging.warning('No chance to download checksums to %s correctly.', filePath)
-
-                    if checksumMode == ChecksumMode.check:
-                        if checkChecksum(filePath):
-                            checksumsOk = True
+                    if knownChecksumTypes:
+                        # checksums provided by the artifact source replace the checksum files
+                        checksumsOk = _checkFileInfo(url, filePath, fileInfo, size, checksums)
                     else:
-                        checksumsOk = True
+                        if checksumMode in (ChecksumMode.download, ChecksumMode.check):
+                            # only checksum files listed by the artifact source are requested if it listed them
+                            checksumFiles = fileInfo.get("checksumFiles") if fileInfo else None
+                            for (checksumType, expectedSize) in (("md5", 32), ("sha1", 40)):
+                                if checksumFiles is not None and checksumType not in checksumFiles:
+                                    logging.debug('There is no %s checksum of %s in the repository',
+                                                  checksumType.upper(), url)
+                                elif not _downloadChecksum(url, filePath, checksumType, expectedSize):
+                                    logging.warning('No chance to download %s checksum to %s correctly.',
+                                                    checksumType.upper(), filePath)
+
+                        if checksumMode == ChecksumMode.check:
+                            if checkChecksum(filePath):
+                                checksumsOk = True
+                        else:
+                            checksumsOk = True
+                        if checksumsOk and fileInfo:
+                            checksumsOk = _checkFileInfo(url, filePath, fileInfo, size, checksums)
 
                     if checksumsOk:
                         logging.debug('Download of %s complete', filePath)
+                        recordUrlStatus(url, httpResponse.code)
                         return httpResponse.code
                     elif retries > 0:
                         logging.warning('Checksum problem with %s, trying again...', url)
@@ -145,9 +257,11 @@ def download(url, filePath=None, checksumMode=ChecksumMode.check):
                         logging.debug('Unable to download, HTTP Response code = %s, trying again...', err.code)
                     else:
                         logging.debug('Unable to download, HTTP Response code = %s.', err.code)
+                        recordUrlStatus(url, err.code)
                         return err.code
                 else:
                     logging.debug('Unable to download, HTTP Response code = %s, giving up...', err.code)
+                    recordUrlStatus(url, err.code)
                     return err.code
     except urllib2.URLError as e:
         logging.error('Unable to download %s, URLError: %s', url, e.reason)
@@ -157,11 +271,11 @@ def download(url, filePath=None, checksumMode=ChecksumMode.check):
         logging.error('ValueError: %s', e.message)
 
 
-def _downloadFile(url, filePath, checksumMode=ChecksumMode.check, warnOnError=True):
+def _downloadFile(url, filePath, checksumMode=ChecksumMode.check, warnOnError=True, fileInfo=None):
     """Downloads file from the given URL to local path if the path does not exist yet."""
     fetched = False
     try:
-        returnCode = download(url, filePath, checksumMode)
+        returnCode = download(url, filePath, checksumMode, fileInfo)
         if (returnCode == 404):
             if warnOnError:
                 logging.warning("Remote file not found: %s", url)
@@ -202,12 +316,13 @@ def _copyFile(filePath, fileLocalPath, checksumMode=ChecksumMode.check):
 
 
 def fetchFile(url, filePath, checksumMode=ChecksumMode.check, warnOnError=True, exitOnError=False,
-              filesetLock=None, fileset=None):
+              filesetLock=None, fileset=None, fileInfo=None):
     """
     Fetch file from the given URL (remote or local), to local path if the path does not exist yet. When using this
     method in multiple threads, it is needed to pass filesetLock and fileset arguments to ensure it is thread-safe.
     filesetLock is a threading.Lock instance, which should be shared in all fetchFile calls. fileset is a set in which
-    is stored set of files which are actually downloaded. It has to be shared too.
+    is stored set of files which are actually downloaded. It has to be shared too. Remote downloads are verified
+    against size and checksums in fileInfo if the artifact source provided them.
     """
     fetched = False
     if filesetLock is not None:
@@ -231,7 +346,7 @@ def fetchFile(url, filePath, checksumMode=ChecksumMode.check, warnOnError=True,
         if not fetched:
             protocol = urlProtocol(url)
             if protocol == 'http' or protocol == 'https':
-                fetched = _downloadFile(url, filePath, checksumMode, warnOnError)
+                fetched = _downloadFile(url, filePath, checksumMode, warnOnError, fileInfo)
             elif protocol == 'file':
                 fetched = _copyFile(url[7:], filePath, checksumMode)
             elif protocol == '':
@@ -350,34 +465,27 @@ def str2bool(v):
 
 
 def gavExists(repoUrl, artifact):
-    """Checks if GAV of the given artifact exists in repository with the given root URL."""
+    """
+    Checks if GAV of the given artifact exists in repository with the given root URL. It is answered from the
+    artifact's maven-metadata.xml, which is fetched once per repository and GA, unless an artifact source has listed
+    the GAV directory already. GAs without metadata and versions missing in possibly stale metadata are probed by HEAD
+    requests.
+    """
     logging.debug("Checking if %s exists in repository %s", str(artifact), repoUrl)
 
     repoUrl = slashAtTheEnd(repoUrl)
 
-    gavUrl = repoUrl + artifact.getDirPath()
-    result = urlExists(gavUrl)
-
+    result = isListedUrl(repoUrl + artifact.getDirPath())
     if not result:
-        logging.debug("URL %s does not exist, trying to find the version in artifact metadata", gavUrl)
-        metadataUrl = repoUrl + artifact.getArtifactDirPath() + "maven-metadata.xml"
-        gaPath = getTempDir(artifact.getArtifactDirPath())
-        metadataFilePath = gaPath + 'maven-metadata.xml'
-        if os.path.exists(metadataFilePath):
-            fetched = True
-        else:
-            fetched = fetchFile(metadataUrl, metadataFilePath, warnOnError=False)
-        if fetched:
-            metadataDoc = ElementTree(file=metadataFilePath)
-            root = metadataDoc.getroot()
-            for versionTag in root.findall("versioning/versions/version"):
-                if versionTag.text == artifact.version:
-                    result = True
-                    break
-        else:
-            # we want to try pom file only when there are no metadata present
+        metadata = loadRepositoryMetadata(repoUrl, artifact.getArtifactDirPath())
+        result = metadata is not None and artifact.version in metadata["versions"]
+    if not result:
+        gavUrl = repoUrl + artifact.getDirPath()
+        result = urlExists(gavUrl)
+        if not result:
             pomUrl = repoUrl + artifact.getPomFilepath()
-            logging.debug("URL %s does not exist. Trying pom file at %s", metadataUrl, pomUrl)
+            logging.debug("URL %s does not exist and the version is not in metadata. Trying pom file at %s", gavUrl,
+                          pomUrl)
             result = urlExists(pomUrl)
 
     logging.debug("Artifact %s %sfound at %s", str(artifact), ("" if result else "not "), repoUrl)
@@ -385,16 +493,129 @@ def gavExists(repoUrl, artifact):
     return result
 
 
+def loadRepositoryMetadata(repoUrl, relDirPath):
+    """
+    Loads maven-metadata.xml from a directory of a repository. Every metadata file is fetched at most once per run
+    and repository, also when more threads ask for it at the same time. Metadata of remote repositories are kept in
+    REPOSITORY_CACHE_PATH and fetched again when they are older than REPOSITORY_CACHE_TTL.
+
+    :param repoUrl: repository root URL
+    :param relDirPath: path of the GA or GAV directory relative to the repository root ending with a slash
+    :returns: dictionary with keys "versions" (set of versions), "timestamp" and "buildNumber" (of the last snapshot
+              build, can be None) and "snapshotVersions" (dictionary {(extension, classifier): version}) or None if
+              the directory does not contain metadata
+    """
+    repoUrl = slashAtTheEnd(repoUrl)
+    key = (repoUrl, relDirPath)
+    with _repositoryMetadataLock:
+        if key in _repositoryMetadata:
+            return _repositoryMetadata[key]
+        keyLock = _repositoryMetadataLocks.setdefault(key, Lock())
+    with keyLock:
+        with _repositoryMetadataLock:
+            loaded = key in _repositoryMetadata
+        if not loaded:
+            metadata = _readRepositoryMetadata(repoUrl, relDirPath)
+            with _repositoryMetadataLock:
+                _repositoryMetadata[key] = metadata
+                del _repositoryMetadataLocks[key]
+    return _repositoryMetadata[key]
+
+
+def _readRepositoryMetadata(repoUrl, relDirPath):
+    metadataUrl = repoUrl + relDirPath + "maven-metadata.xml"
+    protocol = urlProtocol(repoUrl)
+    if protocol in ('file', ''):
+        metadataFilePath = metadataUrl[7:] if protocol == 'file' else metadataUrl
+        if not os.path.isfile(metadataFilePath):
+            logging.debug("Unable to read metadata from %s", metadataUrl)
+            return None
+    else:
+        metadataFilePath = _getRepositoryCachePath(repoUrl, relDirPath + "maven-metadata.xml")
+        # checksums of metadata are not fetched, they are often stale as the metadata are regenerated by repository
+        # managers and the content is checked by parsing anyway
+        if not os.path.exists(metadataFilePath) and not fetchFile(metadataUrl, metadataFilePath,
+                                                                  ChecksumMode.generate, warnOnError=False):
+            logging.debug("Unable to read metadata from %s", metadataUrl)
+            return None
+
+    try:
+        root = ElementTree(file=metadataFilePath).getroot()
+    except ParseError as ex:
+        logging.warning("Unable to parse metadata from %s: %s", metadataUrl, str(ex))
+        return None
+    snapshotVersions = {}
+    for snapshotVersion in root.findall("versioning/snapshotVersions/snapshotVersion"):
+        snapshotVersions[(snapshotVersion.findtext("extension"), snapshotVersion.findtext("classifier") or "")] = \
+            snapshotVersion.findtext("value")
+    return {
+        "versions": set([versionTag.text for versionTag in root.findall("versioning/versions/version")]),
+        "timestamp": root.findtext("versioning/snapshot/timestamp"),
+        "buildNumber": root.findtext("versioning/snapshot/buildNumber"),
+        "snapshotVersions": snapshotVersions,
+    }
+
+
+def _getRepositoryCachePath(repoUrl, relPath):
+    """
+    Gets path of a file of a remote repository kept in REPOSITORY_CACHE_PATH. A copy older than REPOSITORY_CACHE_TTL
+    is removed, so that it is fetched again.
+
+    :param repoUrl: repository root URL ending with a slash
+    :param relPath: path of the file relative to the repository root
+    :returns: path to the cached copy of the file, which may not exist
+    """
+    filePath = os.path.join(REPOSITORY_CACHE_PATH, hashlib.sha1(repoUrl).hexdigest(), relPath)
+    try:
+        if time.time() - os.path.getmtime(filePath) > REPOSITORY_CACHE_TTL:
+            os.remove(filePath)
+    except OSError:
+        pass
+    return filePath
+
+
+def recordListedFiles(dirUrl, filenames):
+    """
+    Records files listed by an artifact source, e.g. in a repository listing or index, as existing, so that they are
+    not probed by urlExists() and gavExists() again.
+
+    :param dirUrl: URL of the directory containing the files
+    :param filenames: names of the listed files
+    """
+    dirUrl = slashAtTheEnd(dirUrl)
+    with _listedUrlsLock:
+        _listedUrls.add(dirUrl)
+        _listedUrls.update([dirUrl + filename for filename in filenames])
+
+
+def isListedUrl(url):
+    """
+    Checks if the URL was recorded by recordListedFiles().
+
+    :param url: URL of a file or a directory ending with a slash
+    :returns: True if an artifact source listed the URL, False otherwise
+    """
+    with _listedUrlsLock:
+        return url in _listedUrls
+
+
 def urlExists(url):
+    if isListedUrl(url):
+        logging.debug("URL %s is listed by an artifact source", url)
+        return True
     parsedUrl = urlparse.urlparse(url)
     protocol = parsedUrl[0]
     if protocol == 'http' or protocol == 'https':
+        if getCachedMissingStatus(url):
+            logging.debug("URL %s is known to be missing", url)
+            return False
         if protocol == 'http':
             connection = httplib.HTTPConnection(parsedUrl[1])
         else:
             connection = httplib.HTTPSConnection(parsedUrl[1])
         connection.request('HEAD', parsedUrl[2], headers={"User-Agent": "Python-Maven Repository Builder"})
         response = connection.getresponse()
+        recordUrlStatus(url, response.status)
         return response.status == 200
     else:
         if protocol == 'file':
@@ -402,6 +623,95 @@ def urlExists(url):
         return os.path.exists(url)
 
 
+def configureNegativeCache(ttl, path=NEGATIVE_CACHE_PATH, lookup=True):
+    """
+    Configures the persistent cache of remote URLs known to be missing. Existence probes and checksum downloads of
+    URLs which answered 404 or 410 are not requested again until their entry expires, downloads of artifacts always
+    request the URL and only refresh its entry. The cache is disabled until this function is called with a non-zero
+    TTL.
+
+    :param ttl: number of seconds for which a missing URL is not requested again, 0 disables the cache
+    :param path: path of the file in which the cache is persisted between runs
+    :param lookup: False to bypass the cached entries, all URLs are requested again and the cache is refreshed from
+                   the responses
+    """
+    global _negativeCache
+    with _negativeCacheLock:
+        _negativeCache = None
+        _negativeCacheSettings.update(path=path, ttl=ttl, lookup=lookup)
+
+
+def getCachedMissingStatus(url):
+    """
+    Looks the URL up in the persistent cache of missing URLs.
+
+    :param url: requested URL
+    :returns: HTTP status code the URL responded with or None if it is not known to be missing
+    """
+    with _negativeCacheLock:
+        if not _negativeCacheSettings["ttl"] or not _negativeCacheSettings["lookup"]:
+            return None
+        entry = _getNegativeCache().get(url)
+    if entry is not None and time.time() - entry[1] < _negativeCacheSettings["ttl"]:
+        return entry[0]
+    return None
+
+
+def recordUrlStatus(url, status):
+    """
+    Records a missing remote URL in the persistent cache of missing URLs, or removes the URL from it if it was found.
+
+    :param url: requested URL
+    :param status: HTTP status code of the response
+    """
+    if urlProtocol(url) not in ('http', 'https'):
+        return
+    with _negativeCacheLock:
+        if not _negativeCacheSettings["ttl"]:
+            return
+        cache = _getNegativeCache()
+        if status in _MISSING_STATUSES:
+            cache[url] = (status, time.time())
+        elif url in cache:
+            del cache[url]
+        else:
+            return
+        # the cache file is an append-only log, found URLs are logged to override their older entries
+        with open(_negativeCacheSettings["path"], "a") as cacheFile:
+            cacheFile.write("%d %d %s\n" % (time.time(), status, url))
+
+
+def _getNegativeCache():
+    """Returns the dictionary {url: (status, timestamp)} of missing URLs, loads it first if needed."""
+    global _negativeCache
+    if _negativeCache is None:
+        path = _negativeCacheSettings["path"]
+        _negativeCache = {}
+        lineCount = 0
+        if os.path.exists(path):
+            expired = time.time() - _negativeCacheSettings["ttl"]
+            with open(path) as cacheFile:
+                for line in cacheFile:
+                    lineCount += 1
+                    parts = line.rstrip("\n").split(" ", 2)
+                    if len(parts) < 3:
+                        continue
+                    (timestamp, status, url) = (int(parts[0]), int(parts[1]), parts[2])
+                    if status in _MISSING_STATUSES and timestamp > expired:
+                        _negativeCache[url] = (status, timestamp)
+                    elif url in _negativeCache:
+                        del _negativeCache[url]
+        elif os.path.dirname(path) and not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        if lineCount > len(_negativeCache):
+            # compact the log, expired and overridden entries are dropped
+            with open(path + ".tmp", "w") as cacheFile:
+                for (url, (status, timestamp)) in _negativeCache.iteritems():
+                    cacheFile.write("%d %d %s\n" % (timestamp, status, url))
+            os.rename(path + ".tmp", path)
+    return _negativeCache
+
+
 def urlProtocol(url):
     """Determines the protocol in the url, can be empty if there is none in the url."""
     parsedUrl = urlparse.urlparse(url)
@@ -427,18 +737,52 @@ def getRegExpsFromStrings(strings, exact=True):
     Compiles all given strings into regular expressions. If exact=True, the
     expressions have prepended ^ and appended $.
     """
-    rep = re.compile("^r\/.*\/$")
-    regExps = []
+    return [re.compile(toRegExpString(s, exact)) for s in strings]
+
+
+def getPatternMatcher(strings, exact=True):
+    """
+    Returns PatternMatcher of the given patterns. Matchers are compiled once per run and list of patterns.
+
+    :param strings: list of patterns, stars are allowed and regular expressions are enclosed in "r/" and "/"
+    :param exact: if True, the patterns must match whole strings, otherwise their prefixes
+    :returns: PatternMatcher instance
+    """
+    key = (tuple(strings), exact)
+    with _patternMatchersLock:
+        if key not in _patternMatchers:
+            _patternMatchers[key] = PatternMatcher(strings, exact)
+        return _patternMatchers[key]
+
+
+def splitGAVAndGATCVPatterns(strings):
+    """
+    Splits excluded GAV patterns to patterns of GAVs and patterns of GATCVs, i.e. patterns containing more than two
+    colons.
+
+    :param strings: list of patterns
+    :returns: tuple (list of GAV patterns, list of GATCV patterns)
+    """
+    gavStrings = []
+    gatcvStrings = []
     for s in strings:
-        if rep.match(s):
-            regexpString = s[2:-1]
+        if toRegExpString(s).count(":") > 2:
+            gatcvStrings.append(s)
         else:
-            regexpString = transformAsterixStringToRegexp(s).strip()
-        if exact:
-            regexpString = "^" + regexpString + "$"
-        regExps.append(re.compile(regexpString))
+            gavStrings.append(s)
+    return (gavStrings, gatcvStrings)
 
-    return regExps
+
+def getGAVAndGATCVMatchers(strings):
+    """
+    Splits excluded GAV patterns to patterns of GAVs and patterns of GATCVs, i.e. patterns containing more than two
+    colons, and returns their matchers.
+
+    :param strings: list of patterns
+    :returns: tuple (GAV PatternMatcher, GATCV PatternMatcher)
+    """
+    (gavStrings, gatcvStrings) = splitGAVAndGATCVPatterns(strings)
+    return (getPatternMatcher(gavStrings), getPatternMatcher(gatcvStrings))
 
 
 def getTempDir(relativePath=""):
@@ -455,6 +799,106 @@ def cleanTempDir():
             logging.error("An error occured while cleaning up temporary directory: %s", str(ex))
 
 
+def writeRepositoryIndex(localRepoDir):
+    """
+    Writes an index of artifact files contained in the given local repository into its root directory. The first
+    line contains the time of creation of the index. Every other line contains the path of a file relative to the
+    repository root (i.e. GAV path and filename), its size, SHA1 checksum and comma-separated types of checksum files
+    present next to it separated by tab characters. Lines are sorted by the path. Checksum and metadata files are not
+    indexed on their own lines.
+
+    :param localRepoDir: root directory of the repository
+    :returns: path of the written index file
+    """
+    entries = []
+    for root, dirs, files in os.walk(localRepoDir):
+        for filename in files:
+            if _regexNotIndexed.search(filename):
+                continue
+            filepath = os.path.join(root, filename)
+            relPath = os.path.relpath(filepath, localRepoDir)
+            # only files in groupId/artifactId/version/ directories belong to an artifact
+            if relPath.count("/") < 3:
+                continue
+            sha1 = None
+            if os.path.exists(filepath + ".sha1"):
+                sha1 = readChecksumFromFile(filepath + ".sha1", 40)
+            if not sha1:
+                sha1 = getSha1Checksum(filepath)
+            checksumTypes = ",".join([checksumType for checksumType in _INDEXED_CHECKSUM_TYPES
+                                      if os.path.exists(filepath + "." + checksumType)])
+            entries.append((relPath, os.path.getsize(filepath), sha1, checksumTypes))
+    entries.sort()
+
+    indexPath = os.path.join(localRepoDir, REPOSITORY_INDEX_FILENAME)
+    with open(indexPath + ".tmp", "w") as indexFile:
+        indexFile.write("#created\t%d\n" % int(time.time()))
+        for entry in entries:
+            indexFile.write("%s\t%d\t%s\t%s\n" % entry)
+    os.rename(indexPath + ".tmp", indexPath)
+    logging.debug("Written repository index %s with %d entries", indexPath, len(entries))
+    return indexPath
+
+
+def readRepositoryIndex(indexPath, maxAge=None):
+    """
+    Reads repository index file written by writeRepositoryIndex().
+
+    :param indexPath: path to the index file
+    :param maxAge: maximum age of the index in seconds, an older index or an index without its creation time is
+                   considered stale, None means any index is used
+    :returns: list of (path, size, sha1, checksumTypes) tuples sorted by path, where checksumTypes is a set of types
+              of checksum files present next to the file or None if the index does not record them, or None if the
+              index file does not exist or is stale
+    """
+    if not os.path.isfile(indexPath):
+        return None
+    created = None
+    entries = []
+    with open(indexPath, "r") as indexFile:
+        for line in indexFile:
+            line = line.rstrip("\n")
+            if line.startswith("#created\t"):
+                created = int(line.split("\t")[1])
+            elif line:
+                fields = line.split("\t")
+                checksumTypes = set(filter(None, fields[3].split(","))) if len(fields) > 3 else None
+                entries.append((fields[0], int(fields[1]), fields[2], checksumTypes))
+    if maxAge is not None and (created is None or time.time() - created > maxAge):
+        logging.info("Repository index %s is older than %d seconds, it is not used", indexPath, maxAge)
+        return None
+    entries.sort()
+    return entries
+
+
+def loadRepositoryIndex(repoUrl, maxAge=None):
+    """
+    Loads index of a local or remote repository if the repository contains it. Remote indexes are downloaded at most
+    once per run and kept in REPOSITORY_CACHE_PATH for REPOSITORY_CACHE_TTL.
+
+    :param repoUrl: repository root URL (supported are [file://], http:// and https:// urls)
+    :param maxAge: maximum age of the index in seconds, see readRepositoryIndex()
+    :returns: list of (path, size, sha1, checksumTypes) tuples sorted by path or None if the repository has no index
+              or it is stale
+    """
+    repoUrl = slashAtTheEnd(repoUrl)
+    protocol = urlProtocol(repoUrl)
+    if protocol == 'file':
+        return readRepositoryIndex(repoUrl[7:] + REPOSITORY_INDEX_FILENAME, maxAge)
+    elif protocol == '':
+        return readRepositoryIndex(repoUrl + REPOSITORY_INDEX_FILENAME, maxAge)
+
+    with _repositoryIndexesLock:
+        if (repoUrl, maxAge) not in _repositoryIndexes:
+            indexPath = _getRepositoryCachePath(repoUrl, REPOSITORY_INDEX_FILENAME)
+            if os.path.exists(indexPath) or fetchFile(repoUrl + REPOSITORY_INDEX_FILENAME, indexPath,
+                                                      ChecksumMode.generate, warnOnError=False):
+                _repositoryIndexes[(repoUrl, maxAge)] = readRepositoryIndex(indexPath, maxAge)
+            else:
+                _repositoryIndexes[(repoUrl, maxAge)] = None
+        return _repositoryIndexes[(repoUrl, maxAge)]
+
+
 def updateSnapshotVersionSuffix(artifact, repoUrl):
     """
     Updates snapshotVersionSuffix in given artifact if the artifact is snapshot and pom
@@ -467,22 +911,25 @@ def updateSnapshotVersionSuffix(artifact, repoUrl):
 
     logging.debug("Adding snapshot version suffix for %s:%s:%s:%s", artifact.groupId,
                   artifact.artifactId, artifact.artifactType, artifact.version)
-    pomUrl = slashAtTheEnd(repoUrl) + artifact.getPomFilepath()
-    if urlExists(pomUrl):
-        logging.debug("Not adding, because pom file %s exists", pomUrl)
+    metadata = loadRepositoryMetadata(repoUrl, artifact.getDirPath())
+    if metadata is None:
+        logging.debug("Unable to read metadata from %s", slashAtTheEnd(repoUrl) + artifact.getDirPath())
         return
 
-    metadataUrl = slashAtTheEnd(repoUrl) + artifact.getDirPath() + 'maven-metadata.xml'
-    gavPath = getTempDir(artifact.getDirPath())
-    metadataFilePath = gavPath + 'maven-metadata.xml'
-    if not os.path.exists(metadataFilePath) and not fetchFile(metadataUrl, metadataFilePath):
-        logging.debug("Unable to read metadata from %s", metadataUrl)
-        return
+    pomVersion = metadata["snapshotVersions"].get(("pom", ""))
+    if pomVersion is not None:
+        # Maven 3 metadata list the real version of every file
+        if pomVersion == artifact.version:
+            logging.debug("Not adding, because pom file is deployed with version %s", pomVersion)
+            return
+    else:
+        pomUrl = slashAtTheEnd(repoUrl) + artifact.getPomFilepath()
+        if urlExists(pomUrl):
+            logging.debug("Not adding, because pom file %s exists", pomUrl)
+            return
 
-    metadataDoc = ElementTree(file=metadataFilePath)
-    root = metadataDoc.getroot()
-    timestamp = root.findtext("versioning/snapshot/timestamp")
-    buildNumber = root.findtext("versioning/snapshot/buildNumber")
+    timestamp = metadata["timestamp"]
+    buildNumber = metadata["buildNumber"]
 
     if timestamp and buildNumber:
         artifact.snapshotVersionSuffix = '-' + timestamp + '-' + buildNumber
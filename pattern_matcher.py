@@ -0,0 +1,177 @@
+"""pattern_matcher.py: Matching of GAV, GATCV and GA strings against large sets of configured patterns"""
+
+import re
+
+
+_regexPattern = re.compile(r"^r\/.*\/$")
+
+# inline flags apply to the whole expression, patterns containing them cannot be merged with other ones
+_inlineFlags = re.compile(r"\(\?[iLmsux]")
+
+# maximum number of patterns merged into one alternation
+MAX_ALTERNATION_SIZE = 500
+
+
+def toRegExpString(pattern, exact=True):
+    """
+    Converts a configured pattern into a regular expression string. Patterns enclosed in "r/" and "/" are regular
+    expressions, in other patterns stars stand for any string.
+
+    :param pattern: the pattern
+    :param exact: if True, the expression has prepended ^ and appended $
+    :returns: regular expression string
+    """
+    if _regexPattern.match(pattern):
+        regexpString = pattern[2:-1]
+    else:
+        regexpString = re.escape(pattern).replace("\\*", ".*").strip()
+    if exact:
+        regexpString = "^" + regexpString + "$"
+    return regexpString
+
+
+class PatternMatcher:
+    """
+    Matcher of strings against a list of configured patterns compiled once. The result is the same as matching the
+    string by every regular expression from maven_repo_util.getRegExpsFromStrings(), but exact patterns without stars
+    are looked up in a set, exact star patterns are looked up by their groupId (the part before the first colon) and
+    the rest is merged into alternations matched at once.
+    """
+
+    def __init__(self, patterns, exact=True):
+        """
+        :param patterns: list of patterns, stars are allowed and regular expressions are enclosed in "r/" and "/"
+        :param exact: if True, the patterns must match whole strings, otherwise their prefixes
+        """
+        self.literals = set()
+        groupRegExps = {}
+        otherRegExps = []
+        for pattern in patterns:
+            regexpString = toRegExpString(pattern, exact)
+            isRegExp = _regexPattern.match(pattern)
+            if exact and not isRegExp and "*" not in pattern and pattern.strip() == pattern:
+                self.literals.add(pattern)
+                continue
+            groupId = pattern.split(":", 1)[0]
+            if exact and not isRegExp and ":" in pattern and "*" not in groupId and groupId.strip() == groupId:
+                groupRegExps.setdefault(groupId, []).append(regexpString)
+            else:
+                otherRegExps.append(regexpString)
+
+        self.groupRegExps = dict((groupId, self._compile(regExps)) for (groupId, regExps) in groupRegExps.iteritems())
+        self.otherRegExps = self._compile(otherRegExps)
+
+    def _compile(self, regexpStrings):
+        """
+        Compiles regular expressions merging them into as few alternations as possible.
+
+        :param regexpStrings: list of regular expression strings
+        :returns: list of compiled regular expressions
+        """
+        compiled = []
+        mergeable = []
+        for regexpString in regexpStrings:
+            regExp = re.compile(regexpString)
+            # groups would be renumbered by merging and break backreferences
+            if regExp.groups or _inlineFlags.search(regexpString):
+                compiled.append(regExp)
+            else:
+                mergeable.append(regexpString)
+        for start in range(0, len(mergeable), MAX_ALTERNATION_SIZE):
+            batch = mergeable[start:start + MAX_ALTERNATION_SIZE]
+            if len(batch) == 1:
+                compiled.append(re.compile(batch[0]))
+            else:
+                compiled.append(re.compile("|".join("(?:%s)" % regexpString for regexpString in batch)))
+        return compiled
+
+    def match(self, string):
+        """
+        Checks if at least one of the patterns matches the string.
+
+        :param string: matched string
+        :returns: True if a pattern matched, False otherwise
+        """
+        # $ matches also before a trailing newline
+        if string in self.literals or (string.endswith("\n") and string[:-1] in self.literals):
+            return True
+        if self.groupRegExps:
+            regExps = self.groupRegExps.get(string.split(":", 1)[0])
+            if regExps and any(regExp.match(string) for regExp in regExps):
+                return True
+        return any(regExp.match(string) for regExp in self.otherRegExps)
+
+    def __nonzero__(self):
+        return bool(self.literals or self.groupRegExps or self.otherRegExps)
+
+
+# the part of a pattern after its first star which does not restrict GAVs starting with the part before the star
+_gavPrefixTail = re.compile(r"^\*(:\*)*$")
+
+
+def getGAVPrefix(pattern):
+    """
+    Finds a prefix such that a GAV pattern matches exactly the GAVs starting with it. That is the case for patterns
+    consisting of a literal part followed by a star, e.g. "org.jboss*" or "org.jboss.foo:*", optionally followed by
+    stars separated by colons which every such GAV contains, e.g. "org.jboss*:*:*".
+
+    :param pattern: GAV pattern, stars are allowed and regular expressions are enclosed in "r/" and "/"
+    :returns: the prefix or None if the pattern is not equivalent to any prefix
+    """
+    if _regexPattern.match(pattern) or pattern.strip() != pattern:
+        return None
+    (prefix, star, tail) = pattern.partition("*")
+    if not star or not _gavPrefixTail.match(star + tail) or tail.count(":") > 2 - prefix.count(":"):
+        return None
+    return prefix
+
+
+class PathPruner:
+    """
+    Decides which directories of a Maven repository contain only artifacts excluded by GAV patterns, so that they do
+    not need to be listed. Only patterns equivalent to a GAV prefix are taken into account (see getGAVPrefix()).
+    A directory path is ambiguous, e.g. org/jboss/foo/ can be a groupId directory, the artifactId directory of
+    org.jboss:foo or the version directory of org:jboss:foo, so it is pruned only if all GAVs under every of these
+    interpretations are excluded.
+    """
+
+    def __init__(self, patterns):
+        """
+        :param patterns: list of excluded GAV patterns
+        """
+        self.prefixes = set()
+        for pattern in patterns:
+            prefix = getGAVPrefix(pattern)
+            if prefix is not None:
+                self.prefixes.add(prefix)
+        # identifies the pruned directories, e.g. in keys of cached listings
+        self.key = "|".join(sorted(self.prefixes))
+
+    def prunes(self, path):
+        """
+        Checks if all artifacts in the directory are excluded.
+
+        :param path: path of the directory relative to the repository root, e.g. "org/jboss/foo/"
+        :returns: True if the directory and its whole subtree can be skipped
+        """
+        if not self.prefixes:
+            return False
+        parts = path.strip("/").split("/")
+        if not parts[0]:
+            return False
+        # beginnings of GAVs in the directory as a groupId directory, an artifactId directory and a version directory
+        gavStarts = [".".join(parts)]
+        if len(parts) >= 2:
+            gavStarts.append("%s:%s:" % (".".join(parts[:-1]), parts[-1]))
+        if len(parts) >= 3:
+            gavStarts.append("%s:%s:%s" % (".".join(parts[:-2]), parts[-2], parts[-1]))
+        for gavStart in gavStarts:
+            for end in xrange(len(gavStart), -1, -1):
+                if gavStart[:end] in self.prefixes:
+                    break
+            else:
+                return False
+        return True
+
+    def __nonzero__(self):
+        return bool(self.prefixes)
@@ -0,0 +1,405 @@
+"""pom_resolver.py: In-process resolver of Maven dependencies working directly with POM files"""
+
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import deque
+from xml.etree import ElementTree
+
+import maven_repo_util
+from maven_artifact import MavenArtifact
+
+
+class PomCycleError(ValueError):
+    """Raised when a POM is its own ancestor or imports a BOM which imports the POM back."""
+
+
+class PomResolver:
+    """
+    Resolver of transitive dependencies of Maven projects, which produces the same list as mvn dependency:list
+    without running Maven. It supports parent inheritance, property interpolation, dependency management including
+    BOM imports, scopes, exclusions and optional dependencies. Profiles, relocations and version ranges other than
+    a single pinned version are not supported. The resolver is experimental, its results have not been verified
+    against Maven on real projects yet (see compare_resolvers.py).
+
+    Effective POMs are cached in the resolver instance, so it should be shared for all GAVs resolved against the same
+    repositories. It is thread-safe.
+    """
+
+    POM_DIR = "poms"
+
+    MAX_INTERPOLATION_DEPTH = 10
+
+    # the wider scope wins when the same dependency is reached through more paths
+    SCOPE_WIDTHS = {"compile": 4, "runtime": 3, "provided": 2, "system": 2, "test": 1}
+
+    # scopes listed by mvn dependency:list for its includeScope parameter
+    INCLUDED_SCOPES = {
+        "compile": set(["compile", "provided", "system"]),
+        "runtime": set(["compile", "runtime"]),
+        "test": set(["compile", "runtime", "provided", "system", "test"]),
+        "provided": set(["provided"]),
+        "system": set(["system"]),
+    }
+
+    _propertyRegEx = re.compile(r'\$\{([^}]+)\}')
+
+    def __init__(self, repoUrls):
+        """
+        :param repoUrls: list of repository URLs searched for POM files in the given order
+        """
+        self.repoUrls = repoUrls
+        self._inheritedModels = {}
+        self._effectivePoms = {}
+        self._cacheLock = threading.Lock()
+        # models being built by the current thread, used to detect cycles of parents and imported BOMs
+        self._local = threading.local()
+
+    def resolve(self, gav, includeScope=None):
+        """
+        Resolves transitive dependencies of the given GAV using "nearest wins" strategy like Maven does.
+
+        :param gav: GAV of the project
+        :param includeScope: scope filter with the same meaning as includeScope parameter of mvn dependency:list,
+                             None lists all scopes
+        :returns: list of strings groupId:artifactId:type[:classifier]:version:scope as written by mvn dependency:list
+                  or None if the POM of the project cannot be read or there is a cycle of parents or imported BOMs
+                  among the POMs of the project and its dependencies
+        """
+        try:
+            return self._resolve(gav, includeScope)
+        except PomCycleError as ex:
+            logging.warning("Cannot resolve dependencies of %s: %s. Skipping...", gav, str(ex))
+            return None
+
+    def _resolve(self, gav, includeScope):
+        root = self.getEffectivePom(gav)
+        if root is None:
+            return None
+        management = dict((self._key(dep), dep) for dep in root["dependencyManagement"])
+
+        resolved = {}
+        order = []
+        queue = deque()
+        for dep in root["dependencies"]:
+            queue.append((dep, dep["scope"], frozenset(dep["exclusions"]), True))
+
+        while queue:
+            (dep, scope, exclusions, direct) = queue.popleft()
+            key = self._key(dep)
+            if key in resolved:
+                # the nearest version was already chosen, only a wider scope of a transitive dependency is taken
+                winner = resolved[key]
+                if not winner[2] and self.SCOPE_WIDTHS.get(scope, 0) > self.SCOPE_WIDTHS.get(winner[1], 0):
+                    resolved[key] = (winner[0], scope, False)
+                continue
+            version = dep["version"]
+            if not version:
+                logging.warning("Missing version of dependency %s:%s in %s", dep["groupId"], dep["artifactId"],
+                                gav)
+                continue
+            if version[0] in "[(":
+                if version[0] == "[" and version[-1] == "]" and "," not in version:
+                    version = version[1:-1]
+                else:
+                    logging.warning("Version range %s of %s:%s is not supported. Skipping...", version,
+                                    dep["groupId"], dep["artifactId"])
+                    continue
+            resolved[key] = (dict(dep, version=version), scope, direct)
+            order.append(key)
+
+            if scope == "system":
+                continue
+            depPom = self.getEffectivePom("%s:%s:%s" % (dep["groupId"], dep["artifactId"], version))
+            if depPom is None:
+                continue
+            for child in depPom["dependencies"]:
+                if child["optional"] or self._isExcluded(child, exclusions):
+                    continue
+                managed = management.get(self._key(child))
+                if managed is not None:
+                    child = dict(child, version=managed["version"] or child["version"],
+                                 scope=managed["scope"] or child["scope"],
+                                 exclusions=child["exclusions"] + managed["exclusions"])
+                childScope = self._deriveScope(scope, child["scope"])
+                if childScope is None:
+                    continue
+                queue.append((child, childScope, exclusions | frozenset(child["exclusions"]), False))
+
+        result = []
+        for key in order:
+            (dep, scope, direct) = resolved[key]
+            if includeScope and scope not in self.INCLUDED_SCOPES.get(includeScope, set([includeScope])):
+                continue
+            parts = [dep["groupId"], dep["artifactId"], dep["type"]]
+            if dep["classifier"]:
+                parts.append(dep["classifier"])
+            parts.extend([dep["version"], scope])
+            result.append(":".join(parts))
+        return result
+
+    def getEffectivePom(self, gav):
+        """
+        Builds the effective model of the given POM, i.e. with its parents merged in, properties interpolated,
+        BOMs imported and dependency management applied on its dependencies.
+
+        :returns: dictionary with keys groupId, artifactId, version, packaging, properties, dependencyManagement and
+                  dependencies or None if the POM or any of its parents cannot be read
+        :raises PomCycleError: if the POM imports a BOM which imports the POM back
+        """
+        return self._getCached(self._effectivePoms, "effective", gav, self._buildEffectivePom)
+
+    def _buildEffectivePom(self, gav):
+        model = self._getInheritedModel(gav)
+        if model is None:
+            return None
+
+        properties = dict(model["properties"])
+        for (name, value) in (("groupId", model["groupId"]), ("artifactId", model["artifactId"]),
+                              ("version", model["version"]), ("packaging", model["packaging"])):
+            properties["project." + name] = properties["pom." + name] = value
+            properties.setdefault(name, value)
+        if model["parent"]:
+            for (name, value) in zip(("groupId", "artifactId", "version"), model["parent"]):
+                properties["project.parent." + name] = properties["parent." + name] = value
+
+        def interpolate(value):
+            return self._interpolate(value, properties)
+
+        management = []
+        managedKeys = set()
+        imports = []
+        for dep in model["dependencyManagement"]:
+            dep = self._interpolateDependency(dep, interpolate)
+            if dep["scope"] == "import" and dep["type"] == "pom":
+                imports.append(dep)
+            else:
+                management.append(dep)
+                managedKeys.add(self._key(dep))
+        # declared management wins over imported one and earlier imports win over later ones
+        for dep in imports:
+            bom = self.getEffectivePom("%s:%s:%s" % (dep["groupId"], dep["artifactId"], dep["version"]))
+            if bom is None:
+                logging.warning("Cannot import BOM %s:%s:%s into %s", dep["groupId"], dep["artifactId"],
+                                dep["version"], gav)
+                continue
+            for managed in bom["dependencyManagement"]:
+                if self._key(managed) not in managedKeys:
+                    management.append(managed)
+                    managedKeys.add(self._key(managed))
+
+        managementByKey = dict((self._key(dep), dep) for dep in management)
+        dependencies = []
+        for dep in model["dependencies"]:
+            dep = self._interpolateDependency(dep, interpolate)
+            managed = managementByKey.get(self._key(dep))
+            if managed is not None:
+                dep = dict(dep, version=dep["version"] or managed["version"], scope=dep["scope"] or managed["scope"],
+                           exclusions=dep["exclusions"] or managed["exclusions"])
+            dependencies.append(dict(dep, scope=dep["scope"] or "compile"))
+
+        return {
+            "groupId": interpolate(model["groupId"]),
+            "artifactId": interpolate(model["artifactId"]),
+            "version": interpolate(model["version"]),
+            "packaging": interpolate(model["packaging"]),
+            "properties": properties,
+            "dependencyManagement": management,
+            "dependencies": dependencies,
+        }
+
+    def _getInheritedModel(self, gav):
+        """Returns the raw model of the POM merged with its parents, but not interpolated yet."""
+        return self._getCached(self._inheritedModels, "inherited", gav, self._buildInheritedModel)
+
+    def _getCached(self, cache, kind, gav, build):
+        """
+        Gets a model from the cache or builds it. No lock is held while the model is built, because building
+        recurses into parents and BOMs and threads reaching the same POMs in different order would block each other.
+        A model built by more threads at once is published only once.
+
+        :param cache: dictionary GAV -> model
+        :param kind: name of the model used in the cycle detection
+        :param gav: GAV of the POM
+        :param build: function building the model of the given GAV
+        :returns: the cached model
+        :raises PomCycleError: if building the model needs the model itself
+        """
+        with self._cacheLock:
+            if gav in cache:
+                return cache[gav]
+        if not hasattr(self._local, "building"):
+            self._local.building = []
+        building = self._local.building
+        if (kind, gav) in building:
+            cycle = [buildingGav for (buildingKind, buildingGav) in building if buildingKind == kind]
+            cycle = cycle[cycle.index(gav):] + [gav]
+            raise PomCycleError("Cycle of parents or imported BOMs found: %s" % " -> ".join(cycle))
+        building.append((kind, gav))
+        try:
+            model = build(gav)
+        finally:
+            building.pop()
+        with self._cacheLock:
+            return cache.setdefault(gav, model)
+
+    def _buildInheritedModel(self, gav):
+        pomPath = self._fetchPom(gav)
+        if pomPath is None:
+            return None
+        try:
+            model = self._parsePom(pomPath)
+        except ElementTree.ParseError as ex:
+            logging.warning("Cannot parse pom of %s: %s", gav, str(ex))
+            return None
+        if not model["parent"]:
+            return model
+
+        parent = self._getInheritedModel(":".join(model["parent"]))
+        if parent is None:
+            logging.warning("Cannot read parent %s of %s", ":".join(model["parent"]), gav)
+            return None
+        properties = dict(parent["properties"])
+        properties.update(model["properties"])
+        return {
+            "parent": model["parent"],
+            "groupId": model["groupId"] or model["parent"][0],
+            "artifactId": model["artifactId"],
+            "version": model["version"] or model["parent"][2],
+            "packaging": model["packaging"],
+            "properties": properties,
+            "dependencyManagement": self._mergeDependencies(parent["dependencyManagement"],
+                                                            model["dependencyManagement"]),
+            "dependencies": self._mergeDependencies(parent["dependencies"], model["dependencies"]),
+        }
+
+    def _mergeDependencies(self, inherited, declared):
+        """Merges lists of dependencies, the declared ones replace inherited ones with the same key."""
+        declaredKeys = set([self._key(dep) for dep in declared])
+        return [dep for dep in inherited if self._key(dep) not in declaredKeys] + declared
+
+    def _fetchPom(self, gav):
+        artifact = MavenArtifact.createFromGAV(gav)
+        pomPath = os.path.join(self.POM_DIR, artifact.getPomFilepath())
+        if os.path.exists(pomPath):
+            return pomPath
+        try:
+            os.makedirs(os.path.dirname(pomPath))
+        except OSError:
+            # already exists or created by another thread in the meantime
+            pass
+        # the POM is fetched into a directory of its own and moved into place when complete, so that a thread
+        # fetching the same POM concurrently never reads it half-written
+        tempDir = tempfile.mkdtemp(dir=os.path.dirname(pomPath))
+        try:
+            tempPath = os.path.join(tempDir, os.path.basename(pomPath))
+            for repoUrl in self.repoUrls:
+                pomUrl = maven_repo_util.slashAtTheEnd(repoUrl) + artifact.getPomFilepath()
+                if maven_repo_util.fetchFile(pomUrl, tempPath, warnOnError=False):
+                    # checksum files first, the POM itself signals that the fetch is complete
+                    pomFilename = os.path.basename(pomPath)
+                    for filename in sorted(os.listdir(tempDir), key=lambda filename: filename == pomFilename):
+                        os.rename(os.path.join(tempDir, filename), os.path.join(os.path.dirname(pomPath), filename))
+                    return pomPath
+        finally:
+            shutil.rmtree(tempDir, ignore_errors=True)
+        logging.warning("Failed to retrieve pom file for artifact %s", gav)
+        return None
+
+    def _parsePom(self, pomPath):
+        root = ElementTree.parse(pomPath).getroot()
+        # the namespace is removed, so that the elements can be found by their plain names
+        for element in root.iter():
+            if isinstance(element.tag, basestring) and element.tag.startswith("{"):
+                element.tag = element.tag.split("}", 1)[1]
+
+        parentElement = root.find("parent")
+        parent = None
+        if parentElement is not None:
+            parent = (self._text(parentElement, "groupId"), self._text(parentElement, "artifactId"),
+                      self._text(parentElement, "version"))
+        properties = {}
+        propertiesElement = root.find("properties")
+        if propertiesElement is not None:
+            for prop in propertiesElement:
+                if isinstance(prop.tag, basestring):
+                    properties[prop.tag] = (prop.text or "").strip()
+
+        return {
+            "parent": parent,
+            "groupId": self._text(root, "groupId"),
+            "artifactId": self._text(root, "artifactId"),
+            "version": self._text(root, "version"),
+            "packaging": self._text(root, "packaging") or "jar",
+            "properties": properties,
+            "dependencyManagement": self._parseDependencies(root.find("dependencyManagement/dependencies")),
+            "dependencies": self._parseDependencies(root.find("dependencies")),
+        }
+
+    def _parseDependencies(self, dependenciesElement):
+        dependencies = []
+        if dependenciesElement is None:
+            return dependencies
+        for element in dependenciesElement.findall("dependency"):
+            exclusions = []
+            for exclusion in element.findall("exclusions/exclusion"):
+                exclusions.append((self._text(exclusion, "groupId") or "*", self._text(exclusion, "artifactId") or "*"))
+            dependencies.append({
+                "groupId": self._text(element, "groupId"),
+                "artifactId": self._text(element, "artifactId"),
+                "version": self._text(element, "version"),
+                "type": self._text(element, "type") or "jar",
+                "classifier": self._text(element, "classifier"),
+                "scope": self._text(element, "scope"),
+                "optional": self._text(element, "optional") == "true",
+                "exclusions": exclusions,
+            })
+        return dependencies
+
+    def _text(self, element, path):
+        child = element.find(path)
+        if child is None or child.text is None:
+            return None
+        return child.text.strip()
+
+    def _interpolateDependency(self, dep, interpolate):
+        return dict(dep, groupId=interpolate(dep["groupId"]), artifactId=interpolate(dep["artifactId"]),
+                    version=interpolate(dep["version"]), type=interpolate(dep["type"]),
+                    classifier=interpolate(dep["classifier"]), scope=interpolate(dep["scope"]),
+                    exclusions=[(interpolate(g), interpolate(a)) for (g, a) in dep["exclusions"]])
+
+    def _interpolate(self, value, properties):
+        """Replaces ${property} expressions, unknown properties are left as they are."""
+        if not value or "${" not in value:
+            return value
+        for _ in range(self.MAX_INTERPOLATION_DEPTH):
+            interpolated = self._propertyRegEx.sub(lambda match: properties.get(match.group(1), match.group(0)),
+                                                   value)
+            if interpolated == value:
+                break
+            value = interpolated
+        return value
+
+    def _deriveScope(self, parentScope, childScope):
+        """
+        Derives scope of a transitive dependency from the scope of the dependency which brought it.
+
+        :returns: the derived scope or None if the dependency is not transitive
+        """
+        if childScope not in ("compile", "runtime"):
+            return None
+        if parentScope == "compile":
+            return childScope
+        return parentScope
+
+    def _isExcluded(self, dep, exclusions):
+        for (groupId, artifactId) in exclusions:
+            if groupId in ("*", dep["groupId"]) and artifactId in ("*", dep["artifactId"]):
+                return True
+        return False
+
+    def _key(self, dep):
+        return (dep["groupId"], dep["artifactId"], dep["type"], dep["classifier"] or "")
@@ -0,0 +1,650 @@
+"""repository_crawler.py: Parallel crawlers of local repositories and of remote repositories browsable through HTML
+index pages"""
+
+import base64
+import hashlib
+import httplib
+import json
+import logging
+import os
+import re
+import socket
+import ssl
+import threading
+import time
+import urllib
+import urlparse
+from Queue import Queue
+from multiprocessing.pool import ThreadPool
+from Queue import Empty
+
+import maven_repo_util
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        # backport of os.scandir for Python 2
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+class ListingCache:
+    """
+    Persistent cache of crawled listings. Every listing is stored in a JSON file named by SHA1 of the listed URL,
+    the depth limit and the variant of the listing. It contains the time of the crawl and for each crawled directory
+    its entries and the ETag and Last-Modified headers of maven-metadata.xml contained in the directory.
+    """
+
+    CACHE_PATH = "cache/listings"
+
+    DEFAULT_TTL = 24 * 60 * 60
+
+    def __init__(self, cacheDir=CACHE_PATH, ttl=DEFAULT_TTL, variant=""):
+        """
+        :param cacheDir: directory to store the listings in
+        :param ttl: number of seconds for which a listing is used without any revalidation
+        :param variant: string distinguishing listings of the same URL which differ in other way than by depth, e.g.
+                        by pruned directories
+        """
+        self.cacheDir = cacheDir
+        self.ttl = ttl
+        self.variant = variant
+
+    def load(self, url, maxDepth):
+        """
+        Loads the cached listing.
+
+        :returns: dictionary with keys "timestamp", "url" and "directories" or None if there is no cached listing
+        """
+        filename = self._getFilename(url, maxDepth)
+        if not os.path.isfile(filename):
+            return None
+        try:
+            with open(filename) as cacheFile:
+                cached = json.load(cacheFile)
+        except ValueError:
+            logging.warning("Ignoring corrupted listing cache file %s", filename)
+            return None
+        for directory in cached["directories"].values():
+            directory["entries"] = [(name.encode("utf-8"), isDir) for (name, isDir) in directory["entries"]]
+            if "deferred" in directory:
+                directory["deferred"] = [name.encode("utf-8") for name in directory["deferred"]]
+        cached["directories"] = dict((relPath.encode("utf-8"), directory)
+                                     for (relPath, directory) in cached["directories"].iteritems())
+        return cached
+
+    def isFresh(self, cached):
+        return time.time() - cached["timestamp"] < self.ttl
+
+    def store(self, url, maxDepth, baseUrl, directories):
+        filename = self._getFilename(url, maxDepth)
+        if not os.path.exists(self.cacheDir):
+            try:
+                os.makedirs(self.cacheDir)
+            except OSError:
+                # created by another thread in the meantime
+                pass
+        tmpFilename = "%s.%s.tmp" % (filename, threading.current_thread().ident)
+        with open(tmpFilename, "w") as cacheFile:
+            json.dump({"timestamp": time.time(), "url": baseUrl, "directories": directories}, cacheFile)
+        os.rename(tmpFilename, filename)
+        logging.debug("Listing of %s stored in %s", url, filename)
+
+    def _getFilename(self, url, maxDepth):
+        if self.variant:
+            key = hashlib.sha1("%s|%s|%s" % (url, maxDepth, self.variant)).hexdigest()
+        else:
+            key = hashlib.sha1("%s|%s" % (url, maxDepth)).hexdigest()
+        return os.path.join(self.cacheDir, "listing_%s.json" % key)
+
+
+class HttpDirectoryCrawler:
+    """
+    Crawler listing remote directories recursively by parsing their HTML index pages as served by Nexus,
+    Artifactory or Apache httpd. Subdirectories are listed in parallel, every thread keeps its own persistent
+    connection to each server. The output has the same format as the output of "lftp find", i.e. "./" followed by
+    paths relative to the listed URL prefixed by "./", directories end with a slash. Proxies are taken from the
+    http_proxy, https_proxy and no_proxy environment variables in the same way as urllib2's ProxyHandler does.
+    """
+
+    # href attribute of an anchor tag, quoted by double or single quotes
+    HREF_REGEX = re.compile(r'<a\s[^>]*?href\s*=\s*(?:"([^"]*)"|\'([^\']*)\')', re.IGNORECASE)
+
+    # maximum number of listed lines waiting for the consumer
+    MAX_QUEUED_LINES = 10000
+
+    # version elements in the versions element of maven-metadata.xml
+    VERSIONS_REGEX = re.compile(r"<versions>(.*?)</versions>", re.DOTALL)
+    VERSION_REGEX = re.compile(r"<version>\s*([^<\s]+)\s*</version>")
+
+    _DONE = object()
+
+    def __init__(self, maxThreads=maven_repo_util.MAX_THREADS, maxDepth=None, retries=3, cache=None,
+                 pruneDirectory=None, deferredVersions=None, verifyCertificates=True):
+        """
+        :param maxThreads: number of threads listing directories in parallel
+        :param maxDepth: maximum depth of listed entries, children of the listed URL have depth 1, None means
+                         unlimited
+        :param retries: number of attempts to list a directory when a 5xx error or a connection problem occurs
+        :param cache: ListingCache instance storing the listings between runs, None disables caching, its variant
+                      must identify pruneDirectory
+        :param pruneDirectory: function returning True for paths of directories relative to the listed URL (ending
+                               with a slash) which should not be listed, their lines are still returned, None means
+                               all directories are listed
+        :param deferredVersions: dictionary to be filled with paths of directories relative to the listed URL
+                                 containing maven-metadata.xml -> list of names of their subdirectories which are
+                                 versions listed in the metadata, these subdirectories are not listed, so that
+                                 the caller can list only the selected ones, None means they are listed as any other
+                                 subdirectories, the cache variant must distinguish both cases
+        :param verifyCertificates: if False, certificates of HTTPS servers are not verified
+        """
+        self.maxThreads = maxThreads
+        self.maxDepth = maxDepth
+        self.retries = retries
+        self.cache = cache
+        self.pruneDirectory = pruneDirectory
+        self.deferredVersions = deferredVersions
+        self.verifyCertificates = verifyCertificates
+        self._local = threading.local()
+
+    def find(self, url):
+        """
+        Lists the given URL recursively. When a listing cache is set, a listing younger than its TTL is returned
+        without any request and an older one is revalidated, i.e. subtrees of directories with unchanged
+        maven-metadata.xml are taken from the cache instead of being listed again, except for snapshot version
+        directories, which are revalidated by their own maven-metadata.xml.
+
+        :param url: URL of the directory to list, only its subtree is crawled
+        :returns: iterator over listed lines, IOError is raised at the end of iteration if listing of any
+                  subdirectory failed
+        """
+        url = maven_repo_util.slashAtTheEnd(url)
+        previous = {}
+        if self.cache is not None:
+            cached = self.cache.load(url, self.maxDepth)
+            if cached is not None:
+                if self.cache.isFresh(cached):
+                    logging.debug("Using cached listing of %s", url)
+                    return self._replay(cached["directories"])
+                previous = cached["directories"]
+        (status, finalUrl, page) = self._fetchIndex(url)
+        if status == 404:
+            raise IOError("Cannot list URL %s. The URL does not exist." % url)
+        elif status != 200:
+            raise IOError("Cannot list URL %s. HTTP response code %s." % (url, status))
+        if finalUrl.endswith("/"):
+            # continue from the redirect target to avoid redirecting every subdirectory request
+            baseUrl = finalUrl
+        else:
+            baseUrl = url
+        return self._crawl(url, baseUrl, self._parseIndex(finalUrl, page), previous)
+
+    def _replay(self, directories):
+        yield "./"
+        for line in self._cachedLines(directories, ""):
+            yield line
+
+    def _cachedLines(self, directories, relPath, revalidated=None):
+        """
+        Returns lines of the cached directory and all its cached subdirectories.
+
+        :param revalidated: list to be filled with paths of cached snapshot subdirectories, which can change even
+                            when the metadata of their GA did not, their subtrees are not returned, None means all
+                            subdirectories are returned
+        """
+        lines = []
+        dirs = [relPath]
+        while dirs:
+            dirPath = dirs.pop()
+            if self.deferredVersions is not None and directories[dirPath].get("deferred"):
+                self.deferredVersions[dirPath] = directories[dirPath]["deferred"]
+            for (name, isDir) in directories[dirPath]["entries"]:
+                if isDir:
+                    lines.append("./%s%s/" % (dirPath, name))
+                    if dirPath + name + "/" in directories:
+                        if revalidated is not None and self._isSnapshotDirectory(directories, dirPath + name + "/"):
+                            revalidated.append(dirPath + name + "/")
+                        else:
+                            dirs.append(dirPath + name + "/")
+                else:
+                    lines.append("./%s%s" % (dirPath, name))
+        return lines
+
+    def _isSnapshotDirectory(self, directories, relPath):
+        """Checks if the cached directory is a snapshot version directory, i.e. its name ends with -SNAPSHOT or it
+        contains its own maven-metadata.xml."""
+        return relPath.endswith("-SNAPSHOT/") or ("maven-metadata.xml", False) in directories[relPath]["entries"]
+
+    def _crawl(self, url, baseUrl, rootEntries, previous):
+        yield "./"
+        work = Queue()
+        output = Queue(self.MAX_QUEUED_LINES)
+        state = {"pending": 0, "errors": [], "directories": {"": {"entries": rootEntries}}, "previous": previous}
+        stateLock = threading.Lock()
+        stopped = threading.Event()
+        deferred = self._deferVersions(baseUrl, "", rootEntries, state["directories"][""])
+
+        for (name, isDir) in rootEntries:
+            if isDir:
+                yield "./%s/" % name
+                if (self.maxDepth is None or self.maxDepth > 1) and not self._prunes(name + "/") \
+                        and name not in deferred:
+                    state["pending"] += 1
+                    work.put((name + "/", 1))
+            else:
+                yield "./%s" % name
+
+        def worker():
+            while True:
+                item = work.get()
+                if item is None or stopped.is_set():
+                    return
+                (relPath, depth) = item
+                try:
+                    for line in self._listDirectory(baseUrl, relPath, depth, work, state, stateLock):
+                        output.put(line)
+                except BaseException as ex:
+                    logging.warning("Error while listing %s%s: %s", baseUrl, relPath, str(ex))
+                    with stateLock:
+                        state["errors"].append(relPath)
+                with stateLock:
+                    state["pending"] -= 1
+                    done = not state["pending"]
+                if done:
+                    output.put(self._DONE)
+
+        if state["pending"]:
+            threads = []
+            for i in range(self.maxThreads):
+                thread = threading.Thread(target=worker, name="crawler-%d" % i)
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+
+            try:
+                while True:
+                    line = output.get()
+                    if line is self._DONE:
+                        break
+                    yield line
+            finally:
+                stopped.set()
+                for thread in threads:
+                    work.put(None)
+                # unblock workers waiting for free space in the output queue when the consumer stopped early
+                while [thread for thread in threads if thread.is_alive()]:
+                    try:
+                        output.get(timeout=0.1)
+                    except Empty:
+                        pass
+
+        if state["errors"]:
+            raise IOError("Listing of %d directories in %s failed, e.g. %s" % (len(state["errors"]), baseUrl,
+                                                                              state["errors"][0]))
+        if self.cache is not None:
+            self.cache.store(url, self.maxDepth, baseUrl, state["directories"])
+
+    def _listDirectory(self, url, relPath, depth, work, state, stateLock):
+        """
+        Lists a single directory, queues its subdirectories and returns lines of its entries. If the directory
+        contains maven-metadata.xml which did not change since the previous crawl, lines of the whole subtree are
+        taken from the previous crawl instead. Snapshot version directories in the subtree are listed again, because
+        snapshots can be redeployed without any change of the metadata of their GA, they are revalidated by their own
+        maven-metadata.xml.
+        """
+        previous = state["previous"].get(relPath)
+        metadata = None
+        if self.cache is not None and previous is not None and previous.get("metadata"):
+            (unchanged, metadata) = self._checkMetadata(url + relPath, previous["metadata"])
+            if unchanged:
+                revalidated = []
+                lines = self._cachedLines(state["previous"], relPath, revalidated)
+                with stateLock:
+                    for dirPath in self._cachedDirectories(state["previous"], relPath, set(revalidated)):
+                        state["directories"][dirPath] = state["previous"][dirPath]
+                    state["pending"] += len(revalidated)
+                for dirPath in revalidated:
+                    work.put((dirPath, depth + dirPath.count("/") - relPath.count("/")))
+                return lines
+
+        (status, finalUrl, page) = self._fetchIndex(url + relPath)
+        if status != 200:
+            raise IOError("HTTP response code %s" % status)
+        entries = self._parseIndex(finalUrl, page)
+        directory = {"entries": entries}
+        deferred = self._deferVersions(url, relPath, entries, directory)
+        lines = []
+        for (name, isDir) in entries:
+            if isDir:
+                lines.append("./%s%s/" % (relPath, name))
+                if (self.maxDepth is None or depth + 1 < self.maxDepth) and not self._prunes(relPath + name + "/") \
+                        and name not in deferred:
+                    with stateLock:
+                        state["pending"] += 1
+                    work.put((relPath + name + "/", depth + 1))
+            else:
+                lines.append("./%s%s" % (relPath, name))
+
+        if self.cache is not None and ("maven-metadata.xml", False) in entries:
+            if metadata is None:
+                metadata = self._checkMetadata(url + relPath, {})[1]
+            if metadata:
+                directory["metadata"] = metadata
+        with stateLock:
+            state["directories"][relPath] = directory
+        return lines
+
+    def _deferVersions(self, url, relPath, entries, directory):
+        """
+        Finds subdirectories of a directory with maven-metadata.xml which are versions listed in the metadata, they are
+        recorded in deferredVersions and in the cached directory.
+
+        :returns: set of names of the deferred subdirectories
+        """
+        if self.deferredVersions is None or ("maven-metadata.xml", False) not in entries:
+            return set()
+        versions = self._getMetadataVersions(url + relPath)
+        deferred = [name for (name, isDir) in entries if isDir and name in versions]
+        if deferred:
+            directory["deferred"] = deferred
+            self.deferredVersions[relPath] = deferred
+        return set(deferred)
+
+    def _getMetadataVersions(self, dirUrl):
+        """
+        Reads versions from maven-metadata.xml in the given directory.
+
+        :returns: set of the versions, it is empty if the metadata cannot be read or contain no versions
+        """
+        try:
+            response = self._requestWithRetries(dirUrl + "maven-metadata.xml")
+        except IOError as ex:
+            logging.debug("Cannot read maven-metadata.xml in %s: %s", dirUrl, str(ex))
+            return set()
+        if response.status != 200:
+            return set()
+        versions = self.VERSIONS_REGEX.search(response.body)
+        if versions is None:
+            return set()
+        return set(self.VERSION_REGEX.findall(versions.group(1)))
+
+    def _prunes(self, relPath):
+        return self.pruneDirectory is not None and self.pruneDirectory(relPath)
+
+    def _cachedDirectories(self, directories, relPath, skipped=()):
+        """Returns paths of the cached directory and all its cached subdirectories except the skipped subtrees."""
+        result = []
+        dirs = [relPath]
+        while dirs:
+            dirPath = dirs.pop()
+            result.append(dirPath)
+            for (name, isDir) in directories[dirPath]["entries"]:
+                if isDir and dirPath + name + "/" in directories and dirPath + name + "/" not in skipped:
+                    dirs.append(dirPath + name + "/")
+        return result
+
+    def _checkMetadata(self, dirUrl, validators):
+        """
+        Checks if maven-metadata.xml in the given directory changed using a conditional HEAD request.
+
+        :param dirUrl: URL of the directory containing maven-metadata.xml
+        :param validators: dictionary with "etag" and "last-modified" response headers from the previous crawl
+        :returns: tuple (unchanged, current validators), the validators are empty if the server sends none of them
+        """
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last-modified"):
+            headers["If-Modified-Since"] = validators["last-modified"]
+        try:
+            response = self._requestWithRetries(dirUrl + "maven-metadata.xml", "HEAD", headers)
+        except IOError as ex:
+            logging.debug("Cannot check maven-metadata.xml in %s: %s", dirUrl, str(ex))
+            return (False, {})
+        if response.status == 304:
+            return (True, validators)
+        if response.status != 200:
+            return (False, {})
+        current = {}
+        for header in ("etag", "last-modified"):
+            if response.getheader(header):
+                current[header] = response.getheader(header)
+        # servers ignoring conditional requests still send the same validators for an unchanged file
+        return (bool(current) and current == validators, current)
+
+    def _parseIndex(self, dirUrl, page):
+        """
+        Parses links to direct children of the directory from its index page. Parent directory links, sorting links
+        and links leading outside of the directory are skipped.
+
+        :returns: list of (name, isDir) tuples
+        """
+        dirPath = urllib.unquote(urlparse.urlparse(dirUrl).path)
+        entries = []
+        seen = set()
+        for match in self.HREF_REGEX.finditer(page):
+            href = match.group(1) if match.group(1) is not None else match.group(2)
+            href = href.replace("&amp;", "&")
+            if not href or "?" in href or "#" in href:
+                continue
+            targetPath = urllib.unquote(urlparse.urlparse(urlparse.urljoin(dirUrl, href)).path)
+            if not targetPath.startswith(dirPath):
+                continue
+            name = targetPath[len(dirPath):]
+            isDir = name.endswith("/")
+            if isDir:
+                name = name[:-1]
+            if not name or "/" in name or name in (".", "..") or name in seen:
+                continue
+            seen.add(name)
+            entries.append((name, isDir))
+        return entries
+
+    def _fetchIndex(self, url, redirects=5):
+        """
+        Fetches the index page using a persistent connection of the current thread.
+
+        :returns: tuple (status, final url after redirects, page content)
+        """
+        response = self._requestWithRetries(url)
+        if response.status in (301, 302, 303, 307) and redirects > 0:
+            location = urlparse.urljoin(url, response.getheader("Location"))
+            return self._fetchIndex(location, redirects - 1)
+        return (response.status, url, response.body)
+
+    def _requestWithRetries(self, url, method="GET", headers={}):
+        """
+        Sends the request, it is repeated on 5xx responses and connection problems.
+
+        :returns: the response with its content read into its body attribute
+        """
+        retries = self.retries
+        while True:
+            retries -= 1
+            try:
+                response = self._request(url, method, headers)
+                response.body = response.read()
+                if response.status / 100 == 5 and retries > 0:
+                    logging.debug("Request %s %s failed with HTTP response code %s, trying again...", method, url,
+                                  response.status)
+                    continue
+                return response
+            except (httplib.HTTPException, socket.error) as ex:
+                self._dropConnection(url)
+                if retries > 0:
+                    logging.debug("Request %s %s failed: %s, trying again...", method, url, str(ex))
+                else:
+                    raise IOError("Cannot %s URL %s: %s" % (method, url, str(ex)))
+
+    def _request(self, url, method="GET", headers={}):
+        parsedUrl = urlparse.urlparse(url)
+        (connection, proxyHeaders) = self._getConnection(parsedUrl.scheme, parsedUrl.netloc)
+        path = parsedUrl.path or "/"
+        if parsedUrl.query:
+            path += "?" + parsedUrl.query
+        requestHeaders = {"User-Agent": "Python-Maven Repository Builder"}
+        requestHeaders.update(headers)
+        if proxyHeaders is not None:
+            # plain HTTP requests are sent to the proxy with the absolute URL
+            path = "%s://%s%s" % (parsedUrl.scheme, parsedUrl.netloc, path)
+            requestHeaders.update(proxyHeaders)
+        connection.request(method, path, headers=requestHeaders)
+        return connection.getresponse()
+
+    def _getConnection(self, scheme, netloc):
+        """
+        Gets the persistent connection of the current thread to the given server, it is opened through a proxy if
+        one is configured for the server.
+
+        :returns: tuple of the connection and headers of plain HTTP requests sent through a proxy or None if no proxy
+                  is used for plain HTTP requests
+        """
+        if not hasattr(self._local, "connections"):
+            self._local.connections = {}
+        key = (scheme, netloc)
+        if key not in self._local.connections:
+            proxy = self._getProxy(scheme, netloc)
+            host = netloc
+            proxyHeaders = None
+            if proxy is not None:
+                host = proxy.netloc.split("@")[-1]
+                proxyHeaders = {}
+                if proxy.username is not None:
+                    credentials = "%s:%s" % (urllib.unquote(proxy.username), urllib.unquote(proxy.password or ""))
+                    proxyHeaders["Proxy-Authorization"] = "Basic " + base64.b64encode(credentials)
+            if scheme == "https":
+                if not hasattr(ssl, "create_default_context"):
+                    # Python older than 2.7.9 cannot verify certificates
+                    connection = httplib.HTTPSConnection(host)
+                elif self.verifyCertificates:
+                    connection = httplib.HTTPSConnection(host, context=ssl.create_default_context())
+                else:
+                    connection = httplib.HTTPSConnection(host, context=ssl._create_unverified_context())
+                if proxy is not None:
+                    # HTTPS is tunneled through the proxy by CONNECT
+                    connection.set_tunnel(netloc, headers=proxyHeaders)
+                    proxyHeaders = None
+            else:
+                connection = httplib.HTTPConnection(host)
+            self._local.connections[key] = (connection, proxyHeaders)
+        return self._local.connections[key]
+
+    def _getProxy(self, scheme, netloc):
+        """
+        Finds the proxy for the given server in the environment variables.
+
+        :returns: parsed URL of the proxy or None if the server is accessed directly
+        """
+        proxy = urllib.getproxies().get(scheme)
+        if not proxy or urllib.proxy_bypass(netloc.split("@")[-1].split(":")[0]):
+            return None
+        if "://" not in proxy:
+            proxy = "http://" + proxy
+        return urlparse.urlparse(proxy)
+
+    def _dropConnection(self, url):
+        parsedUrl = urlparse.urlparse(url)
+        connections = getattr(self._local, "connections", {})
+        connectionAndHeaders = connections.pop((parsedUrl.scheme, parsedUrl.netloc), None)
+        if connectionAndHeaders is not None:
+            connectionAndHeaders[0].close()
+
+
+class LocalDirectoryWalker:
+    """
+    Walker of local directory trees. Top-level directories of the walked tree are walked in parallel, which pays off
+    on network file systems where most of the time is spent waiting for the server. Directory entries are read by
+    scandir when it is available (Python 3.5+ or the scandir package), so no extra stat call is needed per entry.
+    Symbolic links to directories are followed.
+    """
+
+    def __init__(self, maxThreads=maven_repo_util.MAX_THREADS):
+        """
+        :param maxThreads: number of top-level directories walked in parallel
+        """
+        self.maxThreads = maxThreads
+
+    def walk(self, rootDir, prefix="", pruneDirectory=None):
+        """
+        Walks the directory rootDir + prefix recursively.
+
+        :param rootDir: path of the root directory ending with a slash
+        :param prefix: relative path of the walked subdirectory ending with a slash or an empty string
+        :param pruneDirectory: function returning True for paths of directories relative to rootDir (ending with
+                               a slash) which should not be walked, None means all directories are walked
+        :returns: list of (relative directory path, list of filenames) tuples for all directories containing files,
+                  the paths are relative to rootDir and have no slash at the end
+        """
+        if not os.path.isdir(rootDir + prefix):
+            return []
+        result = []
+        # the top levels are listed breadth-first until there are enough directories to walk in parallel, so that
+        # a repository with a single top-level directory (e.g. "org") is walked in parallel too
+        frontier = [prefix]
+        while frontier and len(frontier) < self.maxThreads:
+            subdirs = []
+            for dirPath in frontier:
+                try:
+                    (dirnames, filenames) = self._listDirectory(rootDir + dirPath)
+                except OSError as ex:
+                    logging.warning("Cannot list directory %s%s: %s", rootDir, dirPath, str(ex))
+                    continue
+                if filenames:
+                    result.append((dirPath.rstrip("/"), filenames))
+                subdirs.extend([dirPath + dirname + "/" for dirname in dirnames
+                                if pruneDirectory is None or not pruneDirectory(dirPath + dirname + "/")])
+            frontier = subdirs
+        if not frontier:
+            return result
+
+        pool = ThreadPool(min(self.maxThreads, len(frontier)))
+        try:
+            shards = pool.map(lambda dirPath: self._walkSubtree(rootDir, dirPath.rstrip("/"), pruneDirectory),
+                              frontier)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        for shard in shards:
+            result.extend(shard)
+        return result
+
+    def _walkSubtree(self, rootDir, relPath, pruneDirectory=None):
+        result = []
+        stack = [relPath]
+        while stack:
+            dirPath = stack.pop()
+            try:
+                (dirnames, filenames) = self._listDirectory(rootDir + dirPath)
+            except OSError as ex:
+                logging.warning("Cannot list directory %s%s: %s", rootDir, dirPath, str(ex))
+                continue
+            if filenames:
+                result.append((dirPath, filenames))
+            stack.extend([dirPath + "/" + dirname for dirname in dirnames
+                          if pruneDirectory is None or not pruneDirectory(dirPath + "/" + dirname + "/")])
+        return result
+
+    def _listDirectory(self, path):
+        """
+        :returns: tuple (list of subdirectory names, list of filenames)
+        """
+        dirnames = []
+        filenames = []
+        if scandir is not None:
+            for entry in scandir(path):
+                if entry.is_dir():
+                    dirnames.append(entry.name)
+                else:
+                    filenames.append(entry.name)
+        else:
+            for name in os.listdir(path):
+                if os.path.isdir(os.path.join(path, name)):
+                    dirnames.append(name)
+                else:
+                    filenames.append(name)
+        return (dirnames, filenames)
@@ -27,7 +27,7 @@ check_files_dont_exists(){
 check_number_of_files(){
    echo "Checking number of files "
    NUMBER=$(( $1 * 3 )) # each file have .md5 and .sha1
-   ACTUAL=$(find test-local-maven-repository/ -type f | wc -l)
+   ACTUAL=$(find test-local-maven-repository/ -type f ! -name repository-index.txt | wc -l)
    if [ $ACTUAL -ne $NUMBER ]; then
       echo "  Excepted $NUMBER files, but $ACTUAL exists"
       return 1